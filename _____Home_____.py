@@ -1,10 +1,10 @@
 import streamlit as st
 import requests
 import gspread
-from google.oauth2.service_account import Credentials
 import pandas as pd
 from datetime import datetime
 import pytz
+from utils.sheets_repo import get_sheet_repository
 # 서울 타임존 객체
 seoul_tz = pytz.timezone("Asia/Seoul")
 
@@ -21,65 +21,58 @@ else:
 st.session_state["user"] = st.user.to_dict()
 #st.write(st.session_state["user"])
 
-# 구글 서비스 계정 인증 및 스프레드시트 열기
-SERVICE_ACCOUNT_INFO = st.secrets["google_service_account"]
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
-credentials = Credentials.from_service_account_info(SERVICE_ACCOUNT_INFO, scopes=SCOPES)
-gc = gspread.authorize(credentials)
-
-SHEET_ID = "1Bx4otXnVjpWONjlOMAecK4l-y3CAzxyNmH-O0mcQY0E"  # 실제 사용 중인 시트 ID로 맞추세요
-sh = gc.open_by_key(SHEET_ID)
+# 제어용 시트 저장소 (세션 간 공유, TTL 캐시)
+repo = get_sheet_repository()
 
 # board_roles 시트에서 읽기
-def load_board_roles(sh):
+def load_board_roles(repo):
     try:
-        ws = sh.worksheet("board_roles")
+        repo.worksheet("board_roles")
     except gspread.exceptions.WorksheetNotFound:
-        ws = sh.add_worksheet(title="board_roles", rows=10, cols=2)
-        ws.append_row(["board", "roles"])
+        ws = repo.add_worksheet("board_roles", rows=10, cols=2, header=["board", "roles"])
         # 기본값 추가
         ws.append_row(["자료", "admin, vvip, teacher"])
         ws.append_row(["시간표", "admin, teacher, student"])
         ws.append_row(["상담일지", "admin, semiadmin, teacher"])
-    records = ws.get_all_records()
+        repo.invalidate("board_roles")
+    records = repo.get_records("board_roles")
     board_roles = {row["board"]: [role.strip() for role in row["roles"].split(",") if role.strip()] for row in records}
-    return board_roles, ws
+    return board_roles
 
-# board_roles 시트에 저장
-def save_board_roles(ws, board_roles):
-    ws.clear()
-    ws.append_row(["board", "roles"])
-    for board, roles in board_roles.items():
-        ws.append_row([board, ",".join(roles)])
+# board_roles 시트에 저장 (바뀐 셀만 한 번의 요청으로 기록)
+def save_board_roles(repo, board_roles):
+    rows = [[board, ",".join(roles)] for board, roles in board_roles.items()]
+    repo.write_table("board_roles", ["board", "roles"], rows)
 
 # 등록 신청 시트 관리
-def load_registration(sh):
+def load_registration(repo):
     try:
-        ws = sh.worksheet("registration")
+        ws = repo.worksheet("registration")
     except gspread.exceptions.WorksheetNotFound:
-        ws = sh.add_worksheet(title="registration", rows=100, cols=5)
-        ws.append_row(["신청문구", "email", "name", "신청시간", "처리상태"])
+        ws = repo.add_worksheet("registration", rows=100, cols=5, header=["신청문구", "email", "name", "신청시간", "처리상태"])
     return ws
 
-def save_registration_request(ws, request_text, email, name):
+def save_registration_request(repo, request_text, email, name):
     # 기본값을 서울 시간으로 설정
-    today_seoul = datetime.datetime.now(seoul_tz)
+    today_seoul = datetime.now(seoul_tz)
     current_time = today_seoul.strftime("%Y-%m-%d %H:%M:%S")
-    ws.append_row([request_text, email, name, current_time, "대기중"])
+    repo.append_row("registration", [request_text, email, name, current_time, "대기중"])
     return True
 
 # board_roles 불러오기
-board_roles, board_roles_ws = load_board_roles(sh)
+board_roles = load_board_roles(repo)
 # Store board_roles in session_state for access across pages
 st.session_state['board_roles'] = board_roles
 
 # # 5. 로그인한 사용자 이메일로 권한 확인
 if st.session_state["user"]["is_logged_in"]:
     user_email = st.session_state["user"]["email"]
-    df = pd.DataFrame(sh.worksheet("LoginList").get_all_records())
-    user_row = df[df["email"] == user_email]
-    if not user_row.empty:
-        user_role = user_row.iloc[0]["role"]
+    # 세션에서 이미 확인한 권한은 다시 조회하지 않음
+    if st.session_state.get("user_email") == user_email and st.session_state.get("user_role"):
+        user_role = st.session_state["user_role"]
+    else:
+        user_role = repo.get_role(user_email)
+    if user_role:
         st.session_state["user_role"] = user_role
         st.session_state["user_email"] = user_email
         # 프로필 사진, 이메일, 권한, 로그아웃 버튼
@@ -101,7 +94,7 @@ if st.session_state["user"]["is_logged_in"]:
         if col2.button("로그아웃"):
             st.logout()
         # 등록 신청 시트 불러오기
-        registration_ws = load_registration(sh)
+        load_registration(repo)
         
         # 등록 신청 섹션
         st.markdown("---")
@@ -124,13 +117,11 @@ if st.session_state["user"]["is_logged_in"]:
             if request_text.strip():
                 try:
                     # 중복 신청 체크
-                    existing_requests = registration_ws.get_all_records()
-                    already_requested = any(row.get("email") == user_email for row in existing_requests)
-                    if already_requested:
+                    if repo.has_registration(user_email):
                         st.warning("⚠️ 이미 신청된 아이디입니다. 관리자 승인을 기다려주세요.")
                     else:
                         user_name = st.session_state["user"].get("name", "이름없음")
-                        success = save_registration_request(registration_ws, request_text, user_email, user_name)
+                        success = save_registration_request(repo, request_text, user_email, user_name)
                         if success:
                             st.success("✅ 등록 신청이 완료되었습니다. 관리자 승인을 기다려주세요.")
                             st.info("💡 승인 후 다시 로그인해주세요.")
@@ -157,9 +148,40 @@ if st.session_state["user"]["is_logged_in"]:
                 board_roles[board] = selected
                 updated = True
         if st.button("권한 변경 저장"):
-            save_board_roles(board_roles_ws, board_roles)
+            save_board_roles(repo, board_roles)
             st.success('권한 설정이 저장되었습니다.')
             st.rerun()
+
+    # 등록 신청 일괄 승인 (admin 전용)
+    if user_role == 'admin':
+        st.subheader('등록 신청 승인')
+        load_registration(repo)
+        pending = repo.pending_registrations()
+        if pending:
+            role_options = ['admin', 'semiadmin', 'vvip', 'teacher', 'student', 'ibec']
+            pending_df = pd.DataFrame([
+                {"승인": False, "role": "teacher", "email": row.get("email"), "name": row.get("name"),
+                 "신청문구": row.get("신청문구"), "신청시간": row.get("신청시간")}
+                for row in pending
+            ])
+            edited_df = st.data_editor(
+                pending_df,
+                column_config={
+                    "승인": st.column_config.CheckboxColumn("승인"),
+                    "role": st.column_config.SelectboxColumn("role", options=role_options, required=True),
+                },
+                disabled=["email", "name", "신청문구", "신청시간"],
+                hide_index=True,
+                use_container_width=True,
+                key="registration_editor",
+            )
+            selected_rows = edited_df[edited_df["승인"]]
+            if st.button(f"선택 승인 ({len(selected_rows)}명)", disabled=selected_rows.empty):
+                approved = repo.approve_registrations(dict(zip(selected_rows["email"], selected_rows["role"])))
+                st.success(f'{len(approved)}명의 등록 신청이 승인되었습니다.')
+                st.rerun()
+        else:
+            st.info('대기중인 등록 신청이 없습니다.')
     elif user_role in ['teacher', 'ibec', 'vvip', 'student']:
         # Display board_roles in a styled format
         st.subheader('게시판 목록')
@@ -1,7 +1,5 @@
 import streamlit as st
-from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload, MediaIoBaseUpload
-from google.oauth2.service_account import Credentials
 import io
 import gspread
 import datetime
@@ -10,13 +8,11 @@ import urllib.parse
 import tempfile
 from io import BytesIO
 import time
+from utils.google_clients import get_drive_service, get_spreadsheet
 
-# 구글 서비스 계정 인증
-SERVICE_ACCOUNT_INFO = st.secrets["google_service_account"]
-SCOPES = ["https://www.googleapis.com/auth/drive", "https://www.googleapis.com/auth/spreadsheets"]
-credentials = Credentials.from_service_account_info(SERVICE_ACCOUNT_INFO, scopes=SCOPES)
-drive_service = build('drive', 'v3', credentials=credentials)
-gc = gspread.authorize(credentials)
+# 공유 Drive 서비스와 스프레드시트 (서버 프로세스당 한 번만 생성)
+drive_service = get_drive_service()
+sh = get_spreadsheet()
 
 
 # 로그인/권한 정보 불러오기
@@ -33,11 +29,10 @@ else:
     st.write("IBEC에 관련된 자료를 연결하겠습니다.")
 
     # Check or create the IBEC sheet
-    SHEET_ID = "1Bx4otXnVjpWONjlOMAecK4l-y3CAzxyNmH-O0mcQY0E"
     try:
-        ibec_ws = gc.open_by_key(SHEET_ID).worksheet("IBEC")
+        ibec_ws = sh.worksheet("IBEC")
     except gspread.exceptions.WorksheetNotFound:
-        ibec_ws = gc.open_by_key(SHEET_ID).add_worksheet(title="IBEC", rows=100, cols=5)
+        ibec_ws = sh.add_worksheet(title="IBEC", rows=100, cols=5)
         ibec_ws.append_row(["User", "Text", "URL", "Attachment ID", "Date"])
 
     # Form for posting
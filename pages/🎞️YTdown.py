@@ -1,9 +1,17 @@
 import streamlit as st
 import os
+import re
 import time
-import tempfile
+import threading
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 import yt_dlp
+from yt_dlp.postprocessor import FFmpegVideoConvertorPP, FFmpegVideoRemuxerPP, PostProcessor
 from pathlib import Path # pathlib을 사용하는 것이 좋습니다.
+from utils.file_server import get_file_server
+from utils.storage import get_storage_manager
+from utils.jobs import DONE, FAILED, RUNNING, JobCancelled, JobLimitError, get_job_manager
 
 def main():
     st.set_page_config(
@@ -15,12 +23,19 @@ def main():
     st.title("🎬 YT Downloader by Chois")
     st.write("Youtube 영상을 MP4 파일로 다운로드하세요! 영상 정보를 가져오는데 시간이 조금 걸릴 수 있습니다.")
     
+    # 결과 파일 저장공간 (전용 디렉토리, 용량 한도 관리)
+    storage = get_storage_manager()
+
+    mode = st.radio("모드", ["영상 하나", "여러 영상 (재생목록/URL 목록)"], horizontal=True)
+    if mode != "영상 하나":
+        show_batch_form(storage)
+        show_jobs()
+        show_storage_stats(storage)
+        return
+
     # Youtube URL 입력
     url = st.text_input("Youtube URL을 입력하세요:")
     
-    # 임시 디렉토리 설정
-    temp_dir = tempfile.gettempdir()
-    
     if url:
         try:
             # 비디오 정보 가져오기
@@ -43,37 +58,41 @@ def main():
                 
                 # 사용 가능한 형식 표시 및 해상도 리스트 반환
                 available_resolutions = show_available_formats(video_info)
-                if available_resolutions:
-                    selected_resolution = st.selectbox("화질을 선택하세요:", available_resolutions)
+                # 음악/듣기 수업용: 영상 없이 오디오 스트림만 받는 선택지
+                has_audio = show_audio_format(video_info)
+                if not has_audio:
+                    st.info("이 영상은 오디오만 있는 스트림이 없어 오디오만 받기를 사용할 수 없습니다.")
+                options = available_resolutions + (list(AUDIO_CHOICES) if has_audio else [])
+                if options:
+                    selected_resolution = st.selectbox("화질을 선택하세요:", options)
                 else:
                     st.warning("다운로드 가능한 MP4 화질이 없습니다.")
                     selected_resolution = None
                 
                 # 다운로드 버튼 (선택된 해상도가 있을 때만 활성화)
                 if selected_resolution:
-                    col1, col2 = st.columns([1, 2])
-                    with col1:
-                        if st.button("파일만들기"):
-                            # video_info에서 제목을 가져오되, 없을 경우 기본값 사용
-                            video_title = video_info.get('title', 'youtube_video')
-                            download_path_str = download_video(url, selected_resolution, temp_dir, video_title)
-                            
-                            if download_path_str:
-                                download_path = Path(download_path_str) # 문자열을 Path 객체로 변환
-                                if download_path.exists():
-                                    with open(download_path, "rb") as file:
-                                        with col2:
-                                            st.download_button(
-                                                label="MP4 파일 다운로드",
-                                                data=file,
-                                                file_name=f"{download_path.name}", # Path 객체에서 파일 이름 사용
-                                                mime="video/mp4",
-                                            )
-                                    st.success(f"'{download_path.name}' 다운로드 준비 완료! 위 버튼을 클릭하여 다운로드하세요.")
-                                else:
-                                    st.error("다운로드된 파일을 찾을 수 없습니다. 다시 시도해 주세요.")
-                            else:
-                                st.error("선택한 화질로 다운로드할 수 없습니다. 다른 화질을 선택하거나 URL을 확인해 주세요.")
+                    # 가속 다운로드: DASH/HLS 조각을 동시에 여러 개 받음 (서버 상한 적용)
+                    fragments = 1
+                    if st.checkbox("가속 다운로드 (조각 병렬 받기)", help="긴 강의 영상처럼 조각으로 나뉜 스트림을 더 빠르게 받습니다."):
+                        fragments = st.slider("동시에 받을 조각 수", 2, MAX_CONCURRENT_FRAGMENTS, min(4, MAX_CONCURRENT_FRAGMENTS))
+                    if st.button("파일만들기"):
+                        # video_info에서 제목을 가져오되, 없을 경우 기본값 사용
+                        video_title = video_info.get('title', 'youtube_video')
+                        # 다운로드는 백그라운드 작업으로 실행 (페이지를 떠나도 계속 진행)
+                        # 같은 영상/화질을 다른 사용자가 받고 있으면 그 작업에 합류
+                        video_key = normalize_video_key(url)
+                        audio_codec = AUDIO_CHOICES.get(selected_resolution)
+                        try:
+                            get_job_manager().submit(
+                                download_video,
+                                f"{video_title} ({selected_resolution})",
+                                job_owner(),
+                                url, "audio" if audio_codec else selected_resolution, storage, video_title,
+                                fragments, get_bandwidth_stats(), audio_codec,
+                                key=("video", video_key, selected_resolution),
+                            )
+                        except JobLimitError as e:
+                            st.warning(str(e))
             else:
                 # get_video_info에서 이미 오류 메시지를 표시했을 수 있음
                 st.warning("영상 정보를 가져오지 못했습니다. URL을 확인하거나 잠시 후 다시 시도해 주세요.")
@@ -81,21 +100,259 @@ def main():
         except Exception as e:
             st.error(f"알 수 없는 오류가 발생했습니다: {str(e)}")
             # 개발/디버깅 목적으로 콘솔에 전체 오류 로깅
-            print(f"Main function error: {e}", exc_info=True)
+            print(f"Main function error: {e}")
 
-def get_video_info(url):
-    """yt-dlp를 사용하여 비디오 정보를 가져옵니다"""
+    show_jobs()
+    show_storage_stats(storage)
+
+def show_storage_stats(storage):
+    """저장공간 사용 현황 (관리자만)"""
+    if st.session_state.get("user_role") != "admin":
+        return
+    with st.expander("저장공간 현황"):
+        stats = storage.stats()
+        col1, col2, col3 = st.columns(3)
+        col1.metric("사용량", format_size(stats["bytes"]), f"{stats['usage']:.0%} / {format_size(stats['quota_bytes'])}", delta_color="off")
+        col2.metric("파일 수", stats["files"], f"작성 중 {stats['partial_files']}개", delta_color="off")
+        col3.metric("디스크 여유 공간", format_size(stats["disk_free_bytes"]))
+        st.caption(
+            f"정리된 파일: {stats['evicted_files']}개 ({format_size(stats['evicted_bytes'])}) · "
+            f"가장 오래된 파일: {format_duration(stats['oldest_age_seconds'])} 전 · 위치: {stats['root']}"
+        )
+
+# 묶음 다운로드 설정
+BATCH_RESOLUTIONS = ["1080p", "720p", "480p", "360p"]
+BATCH_WORKERS = 3 # 묶음 작업 하나가 동시에 받는 영상 수 (서버 전체 MAX_WORKERS 제한 안에서)
+MAX_BATCH_ITEMS = 30
+
+def show_batch_form(storage):
+    """재생목록 URL 또는 여러 URL을 받아 하나의 ZIP으로 만드는 묶음 작업을 등록합니다"""
+    st.write("재생목록 URL 하나 또는 영상 URL 여러 개(한 줄에 하나)를 입력하세요. "
+             f"최대 {MAX_BATCH_ITEMS}개까지 동시에 받아 ZIP 파일 하나로 묶어 드립니다.")
+    text = st.text_area("URL 목록", height=150)
+    resolution = st.selectbox("최대 화질", BATCH_RESOLUTIONS, index=1)
+    if st.button("ZIP 파일만들기", disabled=not text.strip()):
+        urls = [line.strip() for line in re.split(r'[\s,]+', text) if line.strip()]
+        try:
+            get_job_manager().submit(
+                download_batch,
+                f"묶음 다운로드 ({len(urls)}개 URL, {resolution})",
+                job_owner(),
+                urls, resolution, storage, get_bandwidth_stats(),
+            )
+        except JobLimitError as e:
+            st.warning(str(e))
+
+def expand_batch_urls(urls):
+    """재생목록은 영상 목록으로 펼쳐서 [(url, 제목)]을 반환합니다"""
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'skip_download': True,
+        'extract_flat': 'in_playlist', # 재생목록은 영상 목록만 가져옴
+    }
+    items = []
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        for url in urls:
+            if len(items) >= MAX_BATCH_ITEMS:
+                break
+            info = ydl.extract_info(url, download=False, process=False)
+            if info.get('_type') in ('playlist', 'multi_video'):
+                # process=False면 entries는 필요한 만큼만 페이지를 받으므로, 상한에 닿으면 바로 멈춤
+                for entry in info.get('entries') or []:
+                    if entry and (entry.get('url') or entry.get('id')):
+                        items.append((entry.get('url') or video_url_for_key(entry['id']), entry.get('title') or entry.get('id')))
+                        if len(items) >= MAX_BATCH_ITEMS:
+                            break
+            else:
+                items.append((info.get('webpage_url') or url, info.get('title') or 'youtube_video'))
+    return items
+
+def download_batch(job, urls, resolution, storage, stats=None):
+    """여러 영상을 동시에 받아 끝나는 대로 ZIP에 추가합니다 (작업 관리자의 워커 스레드에서 실행)
+
+    영상별 진행 상황은 job.items에, 전체 진행률은 job에 기록하고 ZIP 경로를 반환합니다.
+    """
+    job.update(0.0, "재생목록/URL 목록을 확인하는 중...")
+    entries = expand_batch_urls(urls)
+    if not entries:
+        job.error = "받을 수 있는 영상을 찾지 못했습니다."
+        return None
+    items = [job.add_item(title) for _, title in entries]
+
+    def run_item(index):
+        item = items[index]
+        url, title = entries[index]
+        # 서버 전체 동시 다운로드 수 제한을 다른 작업과 함께 지킴
+        with job.item_slot(item):
+            item.state = RUNNING
+            path = download_video(item, url, resolution, storage, title, stats=stats)
+        item.state = DONE if path else FAILED
+        return path
+
+    # 작성 중에는 '.'으로 시작하는 이름을 써서 저장공간 정리 대상에서 제외
+    zip_path = storage.root / f".{job.id}.zip"
+    added = 0
+    try:
+        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+            with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as pool:
+                futures = [pool.submit(run_item, i) for i in range(len(items))]
+                pending = set(range(len(items)))
+                while pending:
+                    # 끝난 영상은 순서대로 바로 ZIP에 추가 (파일 내용은 디스크에서 복사)
+                    for i in sorted(pending):
+                        if futures[i].done():
+                            pending.discard(i)
+                            error = futures[i].exception()
+                            if error is not None:
+                                items[i].state = FAILED
+                                items[i].error = str(error)
+                            elif futures[i].result():
+                                path = Path(futures[i].result())
+                                zf.write(path, arcname=f"{i + 1:02d}_{path.name}")
+                                added += 1
+                    finished = len(items) - len(pending)
+                    overall = sum(1.0 if not item.active else item.progress for item in items) / len(items)
+                    job.update(overall, f"{finished}/{len(items)}개 완료 (ZIP에 {added}개 추가)")
+                    if pending:
+                        time.sleep(0.5)
+    except BaseException:
+        zip_path.unlink(missing_ok=True)
+        raise
+    if added == 0:
+        zip_path.unlink(missing_ok=True)
+        job.error = "받은 영상이 없습니다."
+        return None
+    final_path = storage.root / f"{job.id}.zip"
+    os.replace(zip_path, final_path)
+    storage.request_eviction()
+    failed = len(items) - added
+    job.update(1.0, f"{added}개 영상을 ZIP으로 묶었습니다." + (f" ({failed}개 실패)" if failed else ""))
+    return str(final_path)
+
+def job_owner():
+    """작업 소유자 (로그인 이메일, 없으면 세션별 임시 id)"""
+    if st.session_state.get("user_email"):
+        return st.session_state["user_email"]
+    if "yt_session_id" not in st.session_state:
+        st.session_state["yt_session_id"] = uuid.uuid4().hex
+    return st.session_state["yt_session_id"]
+
+def show_jobs():
+    """내 다운로드 작업 목록
+
+    진행 중인 작업만 1초마다 갱신하는 fragment로 그리고, 끝난 작업(다운로드 버튼)은 fragment 밖에서 그려
+    갱신할 때마다 결과 파일을 다시 읽지 않게 합니다.
+    """
+    manager = get_job_manager()
+    owner = job_owner()
+    jobs = manager.jobs_for(owner)
+    if not jobs:
+        return
+    st.write("---")
+    st.write("#### 내 다운로드 작업")
+    active_ids = [job.id for job in jobs if job.active]
+
+    def render_active():
+        for job_id in active_ids:
+            job = manager.get(job_id)
+            if job is None or not job.active:
+                # 끝난 작업이 생기면 전체 화면을 다시 그려 끝난 작업 목록으로 옮김
+                st.rerun()
+            st.write(f"**{job.label}**")
+            col1, col2 = st.columns([4, 1])
+            col1.progress(job.progress, text=job.message)
+            if col2.button("취소", key=f"cancel_{job.id}"):
+                manager.cancel(job.id, owner)
+            # 묶음 작업은 영상별 진행 상황도 표시
+            for item in job.items:
+                if item.state == FAILED:
+                    st.caption(f"❌ {item.label}: {item.error or item.message}")
+                else:
+                    st.caption(f"{'✅' if item.state == DONE else '⏳'} {item.label} — {item.message}")
+
+    if active_ids:
+        st.fragment(render_active, run_every=1.0)()
+
+    for job in jobs:
+        if job.id in active_ids:
+            continue
+        st.write(f"**{job.label}**")
+        col1, col2 = st.columns([4, 1])
+        if job.state == DONE:
+            download_path = Path(job.result)
+            is_batch = download_path.suffix == ".zip"
+            if download_path.exists():
+                if is_batch:
+                    # 묶음 ZIP은 한 번 내려받으면 지움
+                    deliver_file(col1, job, download_path, "ZIP 파일 다운로드", "application/zip",
+                                 file_name="ytdown.zip", delete_after=True)
+                elif download_path.suffix in AUDIO_MIME_TYPES:
+                    deliver_file(col1, job, download_path, f"{download_path.suffix[1:].upper()} 파일 다운로드",
+                                 AUDIO_MIME_TYPES[download_path.suffix])
+                else:
+                    deliver_file(col1, job, download_path, "MP4 파일 다운로드", "video/mp4")
+            elif is_batch:
+                col1.info("이미 내려받았거나 만료된 ZIP 파일입니다.")
+            else:
+                col1.error("다운로드된 파일을 찾을 수 없습니다. 다시 시도해 주세요.")
+        elif job.state == FAILED:
+            col1.error(job.error or job.message)
+        else:
+            col1.info(job.message)
+        if col2.button("지우기", key=f"remove_{job.id}"):
+            manager.remove(job.id, owner)
+            st.rerun()
+
+# 영상 정보 캐시 (모든 세션 공유)
+VIDEO_INFO_TTL_SECONDS = 60 * 60
+VIDEO_INFO_MAX_ENTRIES = 256
+# 페이지에서 사용하는 필드만 캐시에 보관
+VIDEO_INFO_FIELDS = ('id', 'title', 'uploader', 'duration', 'thumbnail', 'view_count', 'webpage_url')
+FORMAT_FIELDS = (
+    'format_id', 'ext', 'vcodec', 'acodec', 'height', 'fps', 'format_note',
+    'filesize', 'filesize_approx', 'tbr', 'abr', 'protocol',
+)
+
+YOUTUBE_ID_PATTERN = re.compile(
+    r'(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/|v/)|youtu\.be/)([A-Za-z0-9_-]{11})'
+)
+
+def normalize_video_key(url):
+    """URL에서 유튜브 영상 id를 뽑아 캐시 키로 사용합니다 (유튜브가 아니면 URL 그대로)"""
+    url = url.strip()
+    match = YOUTUBE_ID_PATTERN.search(url)
+    if match:
+        return match.group(1)
+    return url
+
+def video_url_for_key(video_key):
+    if re.fullmatch(r'[A-Za-z0-9_-]{11}', video_key):
+        return f"https://www.youtube.com/watch?v={video_key}"
+    return video_key
+
+@st.cache_data(ttl=VIDEO_INFO_TTL_SECONDS, max_entries=VIDEO_INFO_MAX_ENTRIES, show_spinner=False)
+def extract_video_info(video_key):
+    """영상 id별로 yt-dlp 정보를 가져와 필요한 필드만 남겨 캐시합니다"""
     ydl_opts = {
         'quiet': True,
         'no_warnings': True,
         'skip_download': True,
         'noplaylist': True, # 단일 영상 다운로드를 위해 플레이리스트 처리 방지
     }
-    
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(video_url_for_key(video_key), download=False)
+    trimmed = {k: info[k] for k in VIDEO_INFO_FIELDS if k in info}
+    trimmed['formats'] = [
+        {k: f[k] for k in FORMAT_FIELDS if k in f}
+        for f in info.get('formats') or []
+    ]
+    return trimmed
+
+def get_video_info(url):
+    """yt-dlp를 사용하여 비디오 정보를 가져옵니다 (같은 영상은 캐시에서)"""
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            return info
+        return extract_video_info(normalize_video_key(url))
     except yt_dlp.utils.DownloadError as e:
         st.error(f"영상 정보 로딩 중 오류 발생 (yt-dlp): {str(e)}. URL이 정확한지, 영상이 공개 상태인지 확인해주세요.")
         print(f"yt-dlp DownloadError in get_video_info: {e}") # 서버 로그용
@@ -105,6 +362,38 @@ def get_video_info(url):
         print(f"Unexpected error in get_video_info: {e}") # 서버 로그용
         return None
 
+# 오디오만 받기 선택지 -> 추출할 코덱
+AUDIO_CHOICES = {"오디오만 (M4A)": "m4a", "오디오만 (MP3)": "mp3"}
+AUDIO_MIME_TYPES = {".m4a": "audio/mp4", ".mp3": "audio/mpeg"}
+
+def best_audio_format(video_info):
+    """오디오만 있는 스트림 중 음질이 가장 좋은 것 (m4a 우선)"""
+    audio_formats = [
+        f for f in video_info.get('formats') or []
+        if f.get('vcodec') == 'none' and f.get('acodec') not in (None, 'none')
+    ]
+    if not audio_formats:
+        return None
+    return max(audio_formats, key=lambda f: (f.get('ext') == 'm4a', f.get('abr') or f.get('tbr') or 0))
+
+def show_audio_format(video_info):
+    """오디오만 받을 때의 스트림과 예상 크기를 표시합니다 (오디오 스트림이 있으면 True)"""
+    fmt = best_audio_format(video_info)
+    if fmt is None:
+        return False
+    bitrate = fmt.get('abr') or fmt.get('tbr')
+    filesize = fmt.get('filesize') or fmt.get('filesize_approx')
+    if not filesize and bitrate and video_info.get('duration'):
+        filesize = bitrate * 1000 / 8 * video_info['duration'] # kbps 기준 추정
+    display_text = f"• 오디오만 ({fmt.get('ext')}, {fmt.get('acodec')}"
+    if bitrate:
+        display_text += f", {bitrate:.0f}kbps"
+    display_text += ")"
+    if filesize:
+        display_text += f", 예상 크기: {format_size(filesize)}"
+    st.write(display_text)
+    return True
+
 def show_available_formats(video_info):
     """사용 가능한 MP4 형식을 표시하고, 해상도 리스트를 반환합니다."""
     available_resolutions = []
@@ -140,108 +429,289 @@ def show_available_formats(video_info):
         st.write("---")
     return available_resolutions
 
-def download_video(url, resolution, temp_dir, title):
-    """yt-dlp를 사용하여 유튜브 영상을 다운로드합니다"""
-    
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    resolution_num = resolution.replace('p', '')
-    # format_str: 선택한 해상도 이하의 비디오와 오디오를 결합
-    format_str = (
-        f'bestvideo[height<={resolution_num}][ext=mp4]+bestaudio[ext=m4a]/bestvideo[height<={resolution_num}][ext=mp4]'
-        f'/best[height<={resolution_num}][ext=mp4]'
-        f'/best[ext=mp4]' # 해상도 무관 MP4
-        f'/best' # 최후의 수단
-    )
-    
+def output_cache_path(storage, url, resolution, title, ext="mp4"):
+    """(영상 id, 화질)별 결과 파일 경로 (파일 이름은 사용자에게 보여줄 이름)"""
+    safe_key = re.sub(r'[^A-Za-z0-9_-]', '_', normalize_video_key(url))[:100]
     # 안전한 파일명 생성 (Pathlib 사용 권장)
     safe_title = "".join([c if c.isalnum() or c in [' ', '_', '-'] else "_" for c in title])
     safe_title = safe_title.replace(' ', '_') # 공백을 밑줄로 변경
-    output_filename = f"{safe_title}_{resolution}.mp4"
-    output_path = Path(temp_dir) / output_filename # pathlib 사용
+    return storage.root / safe_key / f"{safe_title}_{resolution}.{ext}"
 
-    # 이전 다운로드 파일이 있다면 삭제 (선택 사항)
-    if output_path.exists():
-        try:
-            output_path.unlink()
-        except OSError as e:
-            status_text.warning(f"기존 파일 삭제 실패: {e}. 덮어쓸 수 있습니다.")
+# MP4 컨테이너에 그대로 담을 수 있는 코덱 (접두사 비교)
+MP4_VIDEO_CODECS = ('avc1', 'avc3', 'h264', 'hev1', 'hvc1', 'hevc', 'h265', 'av01', 'vp09', 'vp9', 'mp4v')
+MP4_AUDIO_CODECS = ('mp4a', 'aac', 'mp3', 'opus', 'ac-3', 'ec-3', 'alac', 'flac')
+
+def _codecs_of(info):
+    """선택된 스트림들의 (비디오 코덱, 오디오 코덱)"""
+    formats = info.get('requested_formats') or [info]
+    vcodec = next((f.get('vcodec') for f in formats if f.get('vcodec') not in (None, 'none')), 'none')
+    acodec = next((f.get('acodec') for f in formats if f.get('acodec') not in (None, 'none')), 'none')
+    return vcodec, acodec
+
+def _mp4_compatible(codec, allowed):
+    codec = (codec or 'none').lower()
+    return codec == 'none' or codec.startswith(allowed)
+
+class SmartMp4PostProcessor(PostProcessor):
+    """받은 파일을 MP4로 맞추는 후처리
+
+    이미 MP4면 그대로 두고, 코덱이 MP4와 호환되면 재인코딩 없이 컨테이너만 바꾸며(remux),
+    호환되지 않을 때만 FFmpegVideoConvertor로 재인코딩합니다. 어떤 경로를 거쳤는지 mode에 남깁니다.
+    """
+
+    MODE_LABELS = {'none': '변환 불필요', 'remux': '재인코딩 없이 MP4로 리먹스', 'convert': 'MP4로 재인코딩'}
+
+    def __init__(self, downloader=None, on_mode=None):
+        super().__init__(downloader)
+        self.on_mode = on_mode
+        self.mode = None
+        self.final_path = None
+
+    def run(self, info):
+        vcodec, acodec = _codecs_of(info)
+        if info.get('ext') == 'mp4':
+            self.mode = 'none'
+            files_to_delete = []
+        else:
+            if _mp4_compatible(vcodec, MP4_VIDEO_CODECS) and _mp4_compatible(acodec, MP4_AUDIO_CODECS):
+                self.mode = 'remux'
+                pp = FFmpegVideoRemuxerPP(self._downloader, preferedformat='mp4')
+            else:
+                self.mode = 'convert'
+                pp = FFmpegVideoConvertorPP(self._downloader, preferedformat='mp4')
+            if self.on_mode:
+                self.on_mode(self.mode)
+            files_to_delete, info = pp.run(info)
+        self.final_path = info.get('filepath')
+        print(f"Post-processing {info.get('id')}: {self.mode} ({vcodec}/{acodec})") # 서버 로그용
+        return files_to_delete, info
+
+def downloaded(job_id, path, delete_after):
+    """download_button을 누른 뒤 호출 (버튼을 그릴 때 내용을 이미 넘겼으므로 일회성 파일은 바로 지움)"""
+    st.session_state.setdefault("yt_prepared", set()).discard(job_id)
+    if delete_after:
+        Path(path).unlink(missing_ok=True)
+
+def deliver_file(container, job, path, label, mime, file_name=None, delete_after=False):
+    """결과 파일 다운로드 버튼
+
+    파일 서버가 있으면 디스크에서 스트리밍하는 링크를 주고(Range 요청 지원),
+    없으면 '파일 준비'를 누른 파일만 st.download_button으로 전달합니다 (화면을 그릴 때마다 모든 결과 파일을
+    메모리에 올리지 않도록, 자료실 페이지와 같은 방식).
+    """
+    file_name = file_name or path.name
+    file_server = get_file_server()
+    if file_server is None:
+        prepared = st.session_state.setdefault("yt_prepared", set())
+        if job.id not in prepared:
+            container.button("파일 준비", key=f"prepare_{job.id}", on_click=prepared.add, args=(job.id,))
+            return
+        with open(path, "rb") as file:
+            container.download_button(label=label, data=file, file_name=file_name, mime=mime, key=f"download_{job.id}",
+                                      on_click=downloaded, args=(job.id, path, delete_after))
+        return
+    # 같은 작업의 링크는 세션에서 한 번만 발급
+    links = st.session_state.setdefault("yt_download_links", {})
+    if job.id not in links:
+        links[job.id] = file_server.register(path, file_name, mime, delete_after=delete_after)
+    container.link_button(label, links[job.id])
+
+# 작업 하나가 동시에 받을 수 있는 조각 수 상한
+MAX_CONCURRENT_FRAGMENTS = max(2, int(os.environ.get("YTDOWN_MAX_FRAGMENTS", 8)))
+
+class BandwidthStats:
+    """다운로드 작업들의 누적 전송량/처리량 (한도 조정을 위해 서버 로그에 남김)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.jobs = 0
+        self.total_bytes = 0
+        self.total_seconds = 0.0
+
+    def record(self, job, num_bytes, seconds, fragments):
+        with self._lock:
+            self.jobs += 1
+            self.total_bytes += num_bytes
+            self.total_seconds += seconds
+            average = self.total_bytes / self.total_seconds if self.total_seconds > 0 else 0
+            jobs = self.jobs
+        speed = num_bytes / seconds if seconds > 0 else 0
+        print(
+            f"[bandwidth] job={job.id} fragments={fragments} bytes={num_bytes} "
+            f"seconds={seconds:.1f} speed={format_size(speed)}/s | "
+            f"jobs={jobs} avg={format_size(average)}/s"
+        ) # 서버 로그용
+
+@st.cache_resource(show_spinner=False)
+def get_bandwidth_stats():
+    return BandwidthStats()
+
+def download_video(job, url, resolution, storage, title, fragments=1, stats=None, audio_codec=None):
+    """yt-dlp를 사용하여 유튜브 영상을 다운로드합니다 (작업 관리자의 워커 스레드에서 실행)
+
+    진행 상황은 job에 기록하고, 성공하면 파일 경로를 반환합니다.
+    같은 영상과 화질로 이미 만들어진 파일이 있으면 다시 받지 않고 그 파일을 사용합니다.
+    audio_codec('m4a'/'mp3')을 주면 영상 없이 오디오 스트림만 받아 그 형식으로 추출합니다.
+    """
+    if audio_codec:
+        # 오디오 스트림만 받음 (m4a는 재인코딩 없이 그대로, mp3는 변환)
+        # 오디오만 있는 스트림이 없으면 영상을 받지 않고 실패로 처리
+        format_str = 'bestaudio[ext=m4a]/bestaudio' if audio_codec == 'm4a' else 'bestaudio'
+    else:
+        resolution_num = resolution.replace('p', '')
+        # format_str: 선택한 해상도 이하의 비디오와 오디오를 결합
+        format_str = (
+            f'bestvideo[height<={resolution_num}][ext=mp4]+bestaudio[ext=m4a]/bestvideo[height<={resolution_num}][ext=mp4]'
+            f'/best[height<={resolution_num}][ext=mp4]'
+            f'/best[ext=mp4]' # 해상도 무관 MP4
+            f'/best' # 최후의 수단
+        )
+    
+    output_path = output_cache_path(storage, url, resolution, title, ext=audio_codec or "mp4")
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # 이미 만들어진 파일이 있으면 재사용
+    if output_path.exists() and output_path.stat().st_size > 0:
+        storage.touch(output_path) # 최근 사용 시각 갱신
+        job.update(1.0, f"'{output_path.name}' 이미 준비된 파일을 사용합니다.")
+        return str(output_path)
+
+    # 작업별 임시 파일에 받은 뒤 완성되면 이름을 바꿔서, 다른 요청과 같은 파일을 두고 경쟁하지 않게 함
+    partial_template = output_path.with_name(f".{job.id}.%(ext)s")
+
+    # MP4 호환 코덱이면 재인코딩 없이 컨테이너만 맞춤
+    post_processor = SmartMp4PostProcessor(
+        on_mode=lambda mode: job.update(message=f"후처리 중: {SmartMp4PostProcessor.MODE_LABELS[mode]}...")
+    )
 
     class ProgressHook:
         def __init__(self):
             self.start_time = time.time()
+            self.last_time = self.start_time # 마지막 진행 보고 시각 (후처리 시간은 제외)
+            self.completed_bytes = 0 # 비디오/오디오 등 이미 끝난 스트림의 바이트 수
+            self.current_bytes = 0
             
+        @property
+        def transferred_bytes(self):
+            return self.completed_bytes + self.current_bytes
+
+        @property
+        def elapsed(self):
+            return self.last_time - self.start_time
+
+        def throughput(self):
+            return self.transferred_bytes / self.elapsed if self.elapsed > 0 else 0
+
         def __call__(self, d):
+            self.last_time = time.time()
             if d['status'] == 'downloading':
                 total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
                 downloaded_bytes = d.get('downloaded_bytes', 0)
+                self.current_bytes = downloaded_bytes
                 
                 if total_bytes > 0:
                     percentage = downloaded_bytes / total_bytes
-                    progress_bar.progress(percentage)
                     
-                    elapsed = time.time() - self.start_time
-                    speed = downloaded_bytes / elapsed if elapsed > 0 else 0
-                    
-                    status_text.text(
+                    job.update(
+                        percentage,
                         f"{percentage:.1%} 다운로드 중... "
                         f"({format_size(downloaded_bytes)}/{format_size(total_bytes)}, "
-                        f"{format_size(speed)}/s)"
+                        f"{format_size(self.throughput())}/s"
+                        f"{f', 조각 {fragments}개 동시' if fragments > 1 else ''})"
                     )
+                else:
+                    job.check_cancelled() # 취소 요청이 있으면 여기서 중단
             elif d['status'] == 'finished':
-                status_text.text(f"다운로드 완료! 파일명: {d.get('filename', output_path.name)}. 후처리 중일 수 있습니다...")
-                progress_bar.progress(1.0) # Ensure progress bar is full
+                self.completed_bytes += d.get('total_bytes') or d.get('downloaded_bytes') or self.current_bytes
+                self.current_bytes = 0
+                job.update(1.0, f"다운로드 완료! 파일명: {d.get('filename', output_path.name)}. 후처리 중일 수 있습니다...")
             elif d['status'] == 'error':
-                status_text.error(f"다운로드 중 오류 발생 (yt-dlp hook): {d.get('error', '알 수 없는 오류')}")
+                job.update(message=f"다운로드 중 오류 발생 (yt-dlp hook): {d.get('error', '알 수 없는 오류')}")
                 print(f"yt-dlp hook error: {d}") # 서버 로그용
 
     progress_hook = ProgressHook()
     
     ydl_opts = {
         'format': format_str,
-        'outtmpl': str(output_path), # yt-dlp는 문자열 경로를 기대
+        'outtmpl': str(partial_template), # yt-dlp는 문자열 경로를 기대
         'progress_hooks': [progress_hook],
         'quiet': True,
         'no_warnings': True,
         'noplaylist': True,
-        'postprocessors': [{ # MP4로 확실히 변환하기 위한 설정
-            'key': 'FFmpegVideoConvertor',
-            'preferedformat': 'mp4',
-        }],
+        'concurrent_fragment_downloads': max(1, min(int(fragments), MAX_CONCURRENT_FRAGMENTS)),
         # 'verbose': True, # 디버깅 시 상세 로그 출력
     }
+    if audio_codec:
+        ydl_opts['postprocessors'] = [{
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': audio_codec,
+            'preferredquality': '192',
+        }]
     
     try:
-        status_text.text(f"{resolution} 화질로 다운로드를 시도합니다...")
+        job.update(message=f"{resolution} 화질로 다운로드를 시도합니다...")
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            if not audio_codec:
+                ydl.add_post_processor(post_processor, when='post_process')
             ydl.download([url])
         
         # 다운로드가 성공적으로 완료되었는지 확인
-        if output_path.exists() and output_path.stat().st_size > 0:
-            status_text.success(f"'{output_path.name}' 다운로드 및 처리 완료!")
+        if audio_codec:
+            partial_path = output_path.with_name(f".{job.id}.{audio_codec}")
+        else:
+            partial_path = Path(post_processor.final_path or output_path.with_name(f".{job.id}.mp4"))
+        if partial_path.exists() and partial_path.stat().st_size > 0:
+            os.replace(partial_path, output_path)
+            storage.request_eviction() # 한도 정리는 백그라운드에서
+            if stats is not None:
+                stats.record(job, progress_hook.transferred_bytes, progress_hook.elapsed, fragments)
+            if audio_codec:
+                mode_label = f"오디오만 {audio_codec.upper()}로 추출"
+            else:
+                mode_label = SmartMp4PostProcessor.MODE_LABELS.get(post_processor.mode, '')
+            job.update(
+                1.0,
+                f"'{output_path.name}' 다운로드 및 처리 완료! ({mode_label}, "
+                f"평균 {format_size(progress_hook.throughput())}/s)"
+            )
             return str(output_path)
         else:
             # 이 경우는 yt-dlp가 오류를 발생시키지 않았지만 파일이 생성되지 않은 경우
-            status_text.error("다운로드 후 파일이 생성되지 않았거나 파일 크기가 0입니다. 다른 화질을 시도하거나 로그를 확인하세요.")
-            if not output_path.exists():
-                 print(f"Download finished but output file {output_path} does not exist.")
-            elif output_path.stat().st_size == 0:
-                 print(f"Download finished but output file {output_path} is empty.")
+            job.error = "다운로드 후 파일이 생성되지 않았거나 파일 크기가 0입니다. 다른 화질을 시도하거나 로그를 확인하세요."
+            if not partial_path.exists():
+                 print(f"Download finished but output file {partial_path} does not exist.")
+            elif partial_path.stat().st_size == 0:
+                 print(f"Download finished but output file {partial_path} is empty.")
             return None
 
+    except JobCancelled:
+        raise
     except yt_dlp.utils.DownloadError as e:
+        # 진행 훅에서 취소된 경우 yt-dlp가 DownloadError로 감싸서 올릴 수 있음
+        if job.cancel_requested:
+            raise JobCancelled() from e
         error_message = str(e)
-        status_text.error(f"다운로드 실패 (yt-dlp): {error_message}")
+        if audio_codec and "requested format is not available" in error_message.lower():
+            job.error = "이 영상에는 오디오만 있는 스트림이 없어 오디오만 받을 수 없습니다."
+            print(f"No audio-only format for {url}") # 서버 로그용
+            return None
+        job.error = f"다운로드 실패 (yt-dlp): {error_message}"
         if "ffmpeg" in error_message.lower() or "postprocessing" in error_message.lower():
-            st.info("이 오류는 ffmpeg이 설치되지 않았거나 경로가 올바르지 않을 때 발생할 수 있습니다. "
-                    "MP4 변환 및 일부 고화질 다운로드에는 ffmpeg이 필요합니다.")
+            job.error += ("\n이 오류는 ffmpeg이 설치되지 않았거나 경로가 올바르지 않을 때 발생할 수 있습니다. "
+                          "MP4 변환 및 일부 고화질 다운로드에는 ffmpeg이 필요합니다.")
         print(f"yt-dlp DownloadError in download_video: {e}") # 서버 로그용
         return None
     except Exception as e:
-        status_text.error(f"다운로드 중 알 수 없는 오류 발생: {str(e)}")
-        print(f"Unexpected error in download_video: {e}", exc_info=True) # 서버 로그용
+        job.error = f"다운로드 중 알 수 없는 오류 발생: {str(e)}"
+        print(f"Unexpected error in download_video: {e}") # 서버 로그용
         return None
+    finally:
+        # 실패/취소 시 남은 작업용 임시 파일 정리
+        for leftover in output_path.parent.glob(f".{job.id}.*"):
+            try:
+                leftover.unlink()
+            except OSError:
+                pass
 
 def format_duration(seconds_total):
     """초를 시:분:초 형식으로 변환"""
@@ -1,7 +1,15 @@
-import streamlit as st
-import requests
+import os
+import tempfile
+import time
+from pathlib import Path
+
 import pandas as pd
+import streamlit as st
 from datetime import datetime, timedelta
+from utils.file_server import get_file_server
+from utils.opengov import DISPLAY_COLUMNS, get_client, iter_many, to_frame
+from utils.opengov_export import EXPORT_FORMATS, available_formats, export_documents
+from utils.opengov_store import get_document_store
 
 # List of institutions and their codes
 institutions = [
@@ -20,6 +28,75 @@ institutions = [
     # Add more institutions here
 ]
 
+
+# 조회 중 표를 다시 그리는 최소 간격 (매 페이지마다 전체 표를 다시 보내지 않도록)
+TABLE_REDRAW_SECONDS = 0.5
+EXPORT_FILE_PREFIX = "opengov_export_"
+# 내려받지 않고 남은 내보내기 파일을 지우는 기준 시간
+EXPORT_FILE_TTL_SECONDS = 24 * 60 * 60
+
+
+def remove_stale_exports():
+    """오래된 내보내기 임시 파일 정리 (세션이 끝나 내려받지 않은 파일)"""
+    cutoff = time.time() - EXPORT_FILE_TTL_SECONDS
+    for path in Path(tempfile.gettempdir()).glob(f"{EXPORT_FILE_PREFIX}*"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass
+
+
+def run_export(fmt, selected_institutions, start_date, end_date, store):
+    """조회 결과를 임시 파일로 내보내고 세션에 기록합니다"""
+    suffix, mime = EXPORT_FORMATS[fmt]
+    # 이전 내보내기 파일은 정리 (파일 서버로 받은 파일은 이미 지워졌을 수 있음)
+    previous = st.session_state.pop("opengov_export", None)
+    if previous:
+        Path(previous["path"]).unlink(missing_ok=True)
+    remove_stale_exports()
+    fd, path = tempfile.mkstemp(prefix=EXPORT_FILE_PREFIX, suffix=suffix)
+    os.close(fd)
+    status = st.status(f"{len(selected_institutions)}개 기관의 공문을 {fmt} 파일로 내보내는 중...")
+    written, errors, rows_by_institution = export_documents(
+        path, fmt, selected_institutions, start_date, end_date, store=store,
+        on_progress=lambda rows: status.update(label=f"{rows:,}건 쓰는 중..."),
+    )
+    status.update(label=f"{written:,}건을 내보냈습니다.", state="error" if errors else "complete")
+    for name, error in errors.items():
+        partial_rows = rows_by_institution.get(name, 0)
+        if partial_rows:
+            st.warning(f"{name}: 조회 중 실패해 일부만 파일에 들어갔습니다 ({partial_rows:,}건 포함, 나머지 누락). ({error})")
+        else:
+            st.warning(f"{name}: 데이터를 가져오지 못해 파일에서 빠졌습니다. ({error})")
+    file_name = f"공문목록_{start_date:%Y%m%d}-{end_date:%Y%m%d}{suffix}"
+    export = {"path": path, "file_name": file_name, "mime": mime, "rows": written, "url": None}
+    file_server = get_file_server()
+    if file_server is not None:
+        export["url"] = file_server.register(path, file_name, mime, delete_after=True)
+    st.session_state["opengov_export"] = export
+
+
+def export_downloaded():
+    """download_button을 누른 뒤 호출 (내용은 이미 넘겼으므로 임시 파일을 지움)"""
+    export = st.session_state.pop("opengov_export", None)
+    if export:
+        Path(export["path"]).unlink(missing_ok=True)
+
+
+def show_export():
+    """마지막으로 내보낸 파일의 다운로드 버튼"""
+    export = st.session_state.get("opengov_export")
+    if not export:
+        return
+    label = f"{export['file_name']} 받기 ({export['rows']:,}건)"
+    if export["url"]:
+        st.link_button(label, export["url"])
+    elif Path(export["path"]).exists():
+        with open(export["path"], "rb") as file:
+            st.download_button(label, data=file, file_name=export["file_name"], mime=export["mime"],
+                               on_click=export_downloaded)
+
 # 로그인/권한 정보 불러오기
 user_role = st.session_state.get("user_role")
 user_email = st.session_state.get("user_email")
@@ -34,68 +111,94 @@ else:
     st.write("오늘자 공문은 내일 새벽이 되어야 업데이트 되는것 같습니다. 하루전 까지의 데이터를 검색해 주세요.")
     # ---- 사이드바로 이동 ----
     with st.sidebar:
-        # Institution selection
-        selected_institution = st.selectbox(
-            "Select Institution",
-            options=[inst["name"] for inst in institutions]
+        # Institution selection (여러 기관을 한 번에 비교 가능)
+        institution_names = [inst["name"] for inst in institutions]
+        selected_names = st.multiselect(
+            "Select Institutions",
+            options=institution_names,
+            default=institution_names[:1]
         )
-        # Find the selected institution code
-        selected_code = next(inst["code"] for inst in institutions if inst["name"] == selected_institution)
+        selected_institutions = [inst for inst in institutions if inst["name"] in selected_names]
         # Date selection
         start_date = st.date_input("Start Date", datetime.now()-timedelta(weeks=1))
         end_date = st.date_input("End Date", datetime.now()-timedelta(days=1))
+        # 키워드 검색 (원격 사이트에 요청하지 않고 저장된 모든 기관에서 찾음)
+        keyword = st.text_input("키워드 검색", placeholder="제목, 첨부파일명, 담당자")
+        # 파일로 내보내기 (표를 만들지 않고 조회 결과를 바로 파일에 씀)
+        st.divider()
+        export_format = st.selectbox("내보내기 형식", available_formats())
+        export_clicked = st.button("파일로 내보내기", disabled=not selected_institutions)
+
+    store = get_document_store()
+    columns = ["INSTITUTION"] + DISPLAY_COLUMNS
+
+    if keyword.strip():
+        names_by_code = {inst["code"]: inst["name"] for inst in institutions}
+        results = store.search(keyword)
+        st.subheader(f"'{keyword.strip()}' 검색 결과 {len(results):,}건")
+        st.caption("지금까지 조회해 저장된 공문에서 찾습니다. 원하는 기간이 없으면 검색어를 지우고 먼저 조회해 주세요.")
+        if results:
+            df = pd.DataFrame(results)
+            df.insert(0, "INSTITUTION", df.pop("INSTT_CD").map(lambda code: names_by_code.get(code, code)))
+            st.dataframe(df.reindex(columns=columns))
+        st.stop()
+
+    if not selected_institutions:
+        st.info("조회할 기관을 선택해 주세요.")
+        st.stop()
 
-    # Fetch data
-    url = "https://www.open.go.kr/othicInfo/infoList/orginlInfoList.ajax"
-    headers = {
-        "Accept": "application/json, text/javascript, */*; q=0.01",
-        "Accept-Language": "ko-KR,ko;q=0.9,en-US;q=0.8,en;q=0.7",
-        "Connection": "keep-alive",
-        "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-        "DNT": "1",
-        "Origin": "https://www.open.go.kr",
-        "Referer": "https://www.open.go.kr/othicInfo/infoList/orginlInfoList.do",
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/136.0.0.0 Safari/537.36",
-        "X-Requested-With": "XMLHttpRequest",
-        "sec-ch-ua": '"Chromium";v="136", "Google Chrome";v="136", "Not.A/Brand";v="99"',
-        "sec-ch-ua-mobile": "?0",
-        "sec-ch-ua-platform": '"Windows"',
-    }
-    cookies = {
-        "elevisor_for_j2ee_uid": "gq35037aqy3ns",
-        "JSESSIONID": "D99uVlZ9LutHlqNqWzB131NvFM9Q5TT6WFBp6XVdmbGyH9w5l94ashancsAVXx71.amV1c19kb21haW4vb3BzcG9ydGFsZXh0MQ==",
-        "clientid": "060000502151",
-        "keywords": "%uB300%uAD6C%uACFC%uD559%uACE0"
-    }
-    data = {
-        "kwd": "",
-        "searchInsttCdNmPop": selected_institution,
-        "preKwds": "",
-        "reSrchFlag": "off",
-        "othbcSeCd": "",
-        "insttSeCd": "",
-        "eduYn": "Y",
-        "startDate": start_date.strftime("%Y%m%d"),
-        "endDate": end_date.strftime("%Y%m%d"),
-        "insttCdNm": selected_institution,
-        "insttCd": selected_code,
-        "searchMainYn": "",
-        "viewPage": "1",
-        "rowPage": "1000",
-        "sort": "s",
-        "url": "/othicInfo/infoList/orginlInfoList.ajax",
-        "callBackFn": "searchFn_callBack"
-    }
-
-    response = requests.post(url, headers=headers, cookies=cookies, data=data)
+    if export_clicked:
+        # 여러 달, 여러 학교를 내보낼 때는 화면에 표를 만들지 않음
+        run_export(export_format, selected_institutions, start_date, end_date, store)
+        show_export()
+        st.stop()
+    show_export()
+
+    # Fetch data (선택한 기관을 동시에 조회하며 페이지가 도착하는 대로 표에 추가)
+    progress_bar = st.progress(0.0, text=f"{len(selected_institutions)}개 기관의 공문을 가져오는 중...")
+    table = st.empty()
+    frames, errors, progress = [], {}, {}
+    last_redraw = 0.0
+    # 지난 날짜는 로컬 저장소에서, 빠진 날짜와 최근 며칠만 원격에서 조회
+    for event in iter_many(selected_institutions, start_date, end_date, store=store):
+        name = event.institution["name"]
+        if event.error:
+            errors[name] = event.error
+        if event.rows:
+            frames.append(to_frame(event.institution, event.rows))
+            if time.monotonic() - last_redraw >= TABLE_REDRAW_SECONDS:
+                table.dataframe(pd.concat(frames, ignore_index=True).reindex(columns=columns))
+                last_redraw = time.monotonic()
+        if event.fetched is not None:
+            progress[name] = (event.fetched, event.total)
+        if event.done and name not in errors:
+            fetched = progress.get(name, (0, 0))[0]
+            progress[name] = (fetched, fetched)
+        # 전체 건수를 아직 모르는 기관은 받은 건수만큼만 반영
+        fetched_total = sum(fetched for fetched, _ in progress.values())
+        known_total = sum(total if total is not None else fetched for fetched, total in progress.values())
+        progress_bar.progress(
+            min(1.0, fetched_total / known_total) if known_total else 0.0,
+            text=f"{fetched_total:,} / {known_total:,}건",
+        )
+    progress_bar.empty()
+
+    for name, error in errors.items():
+        st.warning(f"{name}: 데이터를 가져오지 못했습니다. ({error})")
 
     # Display data
-    if response.status_code == 200:
-        datalist = response.json().get("result", {}).get('rtnList', [])
-        if datalist:
-            df = pd.DataFrame(datalist)
-            st.dataframe(df[["DOC_NO", "LAST_UPDT_DT", "INFO_SJ", "FILE_NM", "CHARGER_NM"]])
-        else:
-            st.write("No data found for the selected criteria.")
-    else:
-        st.write("Failed to fetch data.") 
\ No newline at end of file
+    if frames:
+        table.dataframe(pd.concat(frames, ignore_index=True).reindex(columns=columns))
+    elif not errors:
+        st.write("No data found for the selected criteria.")
+    elif len(errors) == len(selected_institutions):
+        st.write("Failed to fetch data.")
+
+    # 정보공개포털 연결 상태 (관리자만)
+    if user_role == "admin":
+        with st.expander("정보공개포털 연결 상태"):
+            stats = get_client().stats()
+            col1, col2, col3 = st.columns(3)
+            col1.metric("요청 수", f"{stats['requests']:,}", f"오류 {stats['errors']:,}", delta_color="off")
+            col2.metric("평균 응답", f"{stats['avg_seconds']:.2f}s", f"최대 {stats['max_seconds']:.2f}s", delta_color="off")
+            col3.metric("세션 쿠키 갱신", f"{stats['bootstraps']:,}회")
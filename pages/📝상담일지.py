@@ -1,16 +1,11 @@
 import streamlit as st
 import pandas as pd
 import gspread
-from google.oauth2.service_account import Credentials
 import pytz
+from utils.google_clients import get_spreadsheet
 
-# 구글 서비스 계정 인증 및 스프레드시트 열기 (app.py와 동일)
-SERVICE_ACCOUNT_INFO = st.secrets["google_service_account"]
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
-credentials = Credentials.from_service_account_info(SERVICE_ACCOUNT_INFO, scopes=SCOPES)
-gc = gspread.authorize(credentials)
-SHEET_ID = "1Bx4otXnVjpWONjlOMAecK4l-y3CAzxyNmH-O0mcQY0E"  # 실제 사용 중인 시트 ID로 맞추세요
-sh = gc.open_by_key(SHEET_ID)
+# 공유 스프레드시트 (인증/클라이언트는 서버 프로세스당 한 번만 생성)
+sh = get_spreadsheet()
 
 # 로그인/권한 정보 불러오기
 user_role = st.session_state.get("user_role")
@@ -1,21 +1,18 @@
 import streamlit as st
 import pandas as pd
 import gspread
-from google.oauth2.service_account import Credentials
 import datetime    
 import pytz
 import google.generativeai as genai
 import openai
 import anthropic # Placeholder for Anthropic, actual library is 'anthropic'
+from utils.google_clients import get_spreadsheet
+from utils.sheets_repo import get_sheet_repository
 
 
-# 구글 서비스 계정 인증 및 스프레드시트 열기 (app.py와 동일)
-SERVICE_ACCOUNT_INFO = st.secrets["google_service_account"]
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
-credentials = Credentials.from_service_account_info(SERVICE_ACCOUNT_INFO, scopes=SCOPES)
-gc = gspread.authorize(credentials)
-SHEET_ID = "1Bx4otXnVjpWONjlOMAecK4l-y3CAzxyNmH-O0mcQY0E"  # 실제 사용 중인 시트 ID로 맞추세요
-sh = gc.open_by_key(SHEET_ID)
+# 공유 스프레드시트 (인증/클라이언트는 서버 프로세스당 한 번만 생성)
+sh = get_spreadsheet()
+repo = get_sheet_repository()
 
 # 로그인/권한 정보 불러오기
 user_role = st.session_state.get("user_role")
@@ -309,7 +306,7 @@ else:
     
     # students 시트 열기
     try:
-        students_ws = sh.worksheet("students")
+        students_ws = repo.worksheet("students")
     except Exception:
         st.warning("students 시트를 찾을 수 없습니다. 학생 정보를 자동으로 불러올 수 없습니다.")
         students_ws = None
@@ -323,7 +320,7 @@ else:
         if not students_ws:
             return ""
         try:
-            all_students = students_ws.get_all_records()
+            all_students = repo.get_records("students")
             # 학년, 반, 번호로 학생 찾기
             for student in all_students:
                 if (student.get('학년') == grade and 
@@ -0,0 +1 @@
+# 여러 페이지에서 공통으로 사용하는 모듈 모음
@@ -0,0 +1,191 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import streamlit as st
+
+from utils.drive_files import download_name, download_to, is_google_doc
+
+# 캐시 위치와 최대 크기 (환경변수로 조정 가능)
+CACHE_DIR = Path(os.environ.get("DRIVE_CACHE_DIR", Path(tempfile.gettempdir()) / "drive_cache"))
+MAX_CACHE_BYTES = int(os.environ.get("DRIVE_CACHE_MAX_BYTES", 1024 * 1024 * 1024))  # 1GB
+# ZIP으로 묶을 때 동시에 내려받는 최대 파일 수
+ZIP_WORKERS = 4
+# 만든 ZIP을 내려받지 않고 두면 이 시간 뒤에 지움
+ZIP_TTL_SECONDS = 24 * 60 * 60
+
+
+class DriveDiskCache:
+    """Drive 다운로드와 구글 문서 PDF 내보내기 결과를 로컬 디스크에 보관하는 캐시
+
+    파일 id와 내용 버전(md5Checksum, 구글 문서는 version/modifiedTime)으로 키를 만들기 때문에
+    원본이 바뀌면 자동으로 새로 받습니다. 최근에 사용한 순서(LRU)로 크기 상한을 유지하며,
+    pin()으로 사용 중이라고 표시한 파일은 지우지 않습니다.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._pins = Counter()
+
+    @staticmethod
+    def key_for(file):
+        if is_google_doc(file):
+            tag = file.get('version') or file.get('modifiedTime') or ''
+        else:
+            tag = file.get('md5Checksum') or file.get('modifiedTime') or ''
+        return hashlib.sha256(f"{file['id']}:{tag}".encode()).hexdigest()
+
+    def _path(self, key):
+        return self.root / key
+
+    def new_zip_path(self):
+        """ZIP을 만들 빈 파일 경로 (캐시 크기 계산에서 빠지는 하위 폴더, 오래된 ZIP은 이때 정리)"""
+        zip_dir = self.root / "zips"
+        zip_dir.mkdir(exist_ok=True)
+        cutoff = time.time() - ZIP_TTL_SECONDS
+        for entry in os.scandir(zip_dir):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+            except OSError:
+                pass
+        fd, path = tempfile.mkstemp(dir=zip_dir, suffix=".zip")
+        os.close(fd)
+        return path
+
+    def pin(self, files):
+        """files를 다 쓸 때까지(unpin) 정리 대상에서 제외합니다 (아직 받지 않은 파일도 가능)"""
+        with self._lock:
+            self._pins.update(self.key_for(file) for file in files)
+
+    def unpin(self, files):
+        with self._lock:
+            self._pins.subtract(self.key_for(file) for file in files)
+            self._pins += Counter()  # 0 이하 항목 제거
+        self._evict()
+
+    def lookup(self, file):
+        """캐시에 있으면 경로를, 없으면 None을 반환합니다"""
+        path = self._path(self.key_for(file))
+        try:
+            os.utime(path)  # LRU 순서 갱신
+        except FileNotFoundError:
+            return None
+        return path
+
+    def get_path(self, drive_service, file):
+        """캐시된 파일 경로를 반환하고, 없으면 내려받아 저장합니다"""
+        key = self.key_for(file)
+        path = self.lookup(file)
+        if path is not None:
+            return path
+        # 같은 파일을 여러 세션이 동시에 요청해도 한 번만 받음
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            path = self.lookup(file)
+            if path is None:
+                path = self._path(key)
+                self._download_atomic(drive_service, file, path)
+                self._evict()
+        with self._lock:
+            self._key_locks.pop(key, None)
+        return path
+
+    def _download_atomic(self, drive_service, file, path):
+        # 임시 파일에 받은 뒤 이름을 바꿔서, 받다가 실패해도 깨진 파일이 남지 않게 함
+        fd, tmp_name = tempfile.mkstemp(dir=self.root, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                download_to(drive_service, file, fh)
+            os.replace(tmp_name, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_name)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def _evict(self):
+        """최대 크기를 넘으면 가장 오래 사용하지 않은 파일부터 지웁니다 (사용 중인 파일 제외)"""
+        with self._lock:
+            pinned = set(self._pins)
+        entries = []
+        total = 0
+        for entry in os.scandir(self.root):
+            if not entry.is_file() or entry.name.endswith(".part"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            total += stat.st_size
+            if entry.name not in pinned:
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        if total <= self.max_bytes:
+            return
+        for _, size, entry_path in sorted(entries):
+            try:
+                os.unlink(entry_path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+def build_zip(drive_service, cache, files, zip_path, on_progress=None):
+    """선택한 파일들을 병렬로 받아 zip_path에 ZIP으로 묶습니다
+
+    각 파일은 디스크 캐시로 받은 뒤 끝나는 순서대로 디스크에서 ZIP에 복사하므로
+    여러 파일 내용을 한꺼번에 메모리에 올리지 않습니다. 다 묶을 때까지 캐시 정리에서 제외하므로
+    선택한 파일이 캐시 상한보다 커도 됩니다. 받지 못한 파일 이름 목록을 반환합니다.
+    """
+    failed = []
+    used_names = set()
+    cache.pin(files)
+    try:
+        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+            with ThreadPoolExecutor(max_workers=ZIP_WORKERS) as pool:
+                futures = {pool.submit(cache.get_path, drive_service, file): file for file in files}
+                for done, future in enumerate(as_completed(futures), start=1):
+                    file = futures[future]
+                    try:
+                        zf.write(future.result(), arcname=_unique_name(download_name(file), used_names))
+                    except Exception as e:
+                        print(f"ZIP에 추가하지 못함 ({file['name']}): {e}")  # 서버 로그용
+                        failed.append(file['name'])
+                    if on_progress:
+                        on_progress(done, len(futures))
+    finally:
+        cache.unpin(files)
+    return failed
+
+
+def _unique_name(name, used_names):
+    # 같은 이름의 파일이 여러 개면 "이름 (2).pdf" 형태로 구분
+    stem, dot, ext = name.rpartition(".")
+    if not dot:
+        stem, ext = name, ""
+    candidate, n = name, 2
+    while candidate in used_names:
+        candidate = f"{stem} ({n}){dot}{ext}"
+        n += 1
+    used_names.add(candidate)
+    return candidate
+
+
+@st.cache_resource(show_spinner=False)
+def get_drive_cache():
+    """서버 프로세스 전체에서 공유하는 디스크 캐시"""
+    return DriveDiskCache()
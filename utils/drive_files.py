@@ -0,0 +1,53 @@
+from googleapiclient.http import MediaIoBaseDownload
+
+GOOGLE_APPS_PREFIX = 'application/vnd.google-apps.'
+FOLDER_MIME = 'application/vnd.google-apps.folder'
+EXPORT_MIME = 'application/pdf'  # 구글 문서류는 PDF로 내보내기
+
+# 목록 화면과 캐시 키에 필요한 메타데이터만 요청
+FILE_FIELDS = "id, name, mimeType, size, modifiedTime, md5Checksum, version"
+
+
+def is_folder(file):
+    return file.get('mimeType') == FOLDER_MIME
+
+
+def is_google_doc(file):
+    """구글 문서/시트/슬라이드처럼 내보내기가 필요한 파일인지"""
+    mime = file.get('mimeType', '')
+    return mime.startswith(GOOGLE_APPS_PREFIX) and mime != FOLDER_MIME
+
+
+def download_name(file):
+    return f"{file['name']}.pdf" if is_google_doc(file) else file['name']
+
+
+def download_mime(file):
+    if is_google_doc(file):
+        return EXPORT_MIME
+    return file.get('mimeType') or 'application/octet-stream'
+
+
+def _media_request(drive_service, file):
+    if is_google_doc(file):
+        return drive_service.files().export_media(fileId=file['id'], mimeType=EXPORT_MIME)
+    return drive_service.files().get_media(fileId=file['id'])
+
+
+def download_to(drive_service, file, fh):
+    """파일 내용을 fh에 청크 단위로 기록합니다 (구글 문서는 PDF로 내보냄)"""
+    downloader = MediaIoBaseDownload(fh, _media_request(drive_service, file))
+    done = False
+    while not done:
+        _, done = downloader.next_chunk()
+
+
+def format_size(size_bytes):
+    """바이트를 읽기 쉬운 형식으로 변환"""
+    units = ['B', 'KB', 'MB', 'GB', 'TB']
+    i = 0
+    size = float(size_bytes)
+    while size >= 1024 and i < len(units) - 1:
+        size /= 1024
+        i += 1
+    return f"{size:.1f} {units[i]}"
@@ -0,0 +1,232 @@
+import bisect
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from utils.drive_files import FILE_FIELDS, FOLDER_MIME
+from utils.google_clients import get_drive_service
+
+# changes 피드로 갱신을 확인하는 최소 간격
+SYNC_INTERVAL_SECONDS = 30
+# 피드에서 놓친 변경이 있어도 복구되도록 주기적으로 전체 목록을 다시 받음
+FULL_RESYNC_SECONDS = 6 * 60 * 60
+# 하위 폴더를 동시에 조회하는 최대 작업 수
+LIST_WORKERS = 8
+
+
+class FolderIndex:
+    """Drive 폴더 트리의 파일 목록을 로컬에 유지하는 인덱스
+
+    처음 한 번은 pageToken을 따라 전체 목록을 받고, 이후에는 changes.list의
+    startPageToken부터 바뀐 파일만 반영합니다. 페이지 로드는 로컬 스냅샷을 읽습니다.
+    하위 폴더는 처음 열 때 목록을 받아 추적 대상에 추가하고, build_tree()로
+    트리 전체를 병렬로 색인해 이름 검색에 사용할 수 있습니다.
+    """
+
+    def __init__(self, drive_service, folder_ids):
+        self._service = drive_service
+        self._root_ids = list(folder_ids)
+        self._lock = threading.Lock()  # 스냅샷 보호
+        self._sync_lock = threading.Lock()  # 동시에 한 스레드만 동기화
+        self._files = {}  # folder id -> {file id -> metadata}
+        self._version = 0  # 스냅샷이 바뀔 때마다 증가
+        # (만든 시점의 version, [(소문자 이름, file id)], file id -> metadata, file id -> 상위 폴더 id)
+        self._name_index = (None, [], {}, {})
+        self._tree_built = set()
+        self._page_token = None
+        self._last_sync = 0.0
+        self._last_full = 0.0
+
+    def list(self, folder_id):
+        """folder_id의 파일 목록 스냅샷 (폴더 먼저, 이름순)
+
+        아직 추적하지 않는 하위 폴더는 이때 목록을 받아 추적 대상에 추가합니다.
+        """
+        self.sync()
+        with self._lock:
+            tracked = folder_id in self._files
+        if not tracked:
+            files = self._list_all(folder_id)
+            with self._lock:
+                self._files.setdefault(folder_id, files)
+                self._version += 1
+        with self._lock:
+            files = list(self._files.get(folder_id, {}).values())
+        return sorted(files, key=lambda f: (f.get('mimeType') != FOLDER_MIME, f.get('name', '')))
+
+    def build_tree(self, root_id):
+        """root_id 아래의 모든 하위 폴더를 병렬로 색인합니다 (전체 목록을 다시 받은 뒤에는 빠진 폴더만 다시 확인)"""
+        self.sync()
+        with self._lock:
+            if root_id in self._tree_built:
+                return
+        self._list_tree([root_id])
+        with self._lock:
+            self._tree_built.add(root_id)
+
+    def _list_tree(self, pending):
+        """pending 폴더들과 그 아래 하위 폴더 중 아직 추적하지 않는 것을 병렬로 받아 추가합니다"""
+        with ThreadPoolExecutor(max_workers=LIST_WORKERS) as pool:
+            while pending:
+                with self._lock:
+                    missing = [fid for fid in pending if fid not in self._files]
+                listed = dict(zip(missing, pool.map(self._list_all, missing)))
+                with self._lock:
+                    for fid, files in listed.items():
+                        self._files.setdefault(fid, files)
+                    self._version += 1
+                    pending = [
+                        file['id']
+                        for fid in pending
+                        for file in self._files.get(fid, {}).values()
+                        if file.get('mimeType') == FOLDER_MIME
+                    ]
+
+    def search(self, query, limit=100):
+        """색인된 파일 중 이름이 query로 시작하는 것을 먼저, 그다음 query를 포함하는 것을 반환
+
+        결과는 (파일 메타데이터, 경로) 목록입니다.
+        """
+        query = query.strip().lower()
+        if not query:
+            return []
+        names, by_id, parents = self._get_name_index()
+        # 정렬된 이름 목록에서 접두사 구간을 이진 탐색
+        start = bisect.bisect_left(names, (query,))
+        prefix_ids = []
+        for name, file_id in names[start:]:
+            if not name.startswith(query):
+                break
+            prefix_ids.append(file_id)
+        seen = set(prefix_ids)
+        substring_ids = [file_id for name, file_id in names if file_id not in seen and query in name]
+        return [
+            (by_id[file_id], _path(file_id, by_id, parents))
+            for file_id in (prefix_ids + substring_ids)[:limit]
+        ]
+
+    def _get_name_index(self):
+        with self._lock:
+            if self._name_index[0] != self._version:
+                by_id, parents = {}, {}
+                for folder_id, files in self._files.items():
+                    for fid, meta in files.items():
+                        by_id.setdefault(fid, meta)
+                        parents.setdefault(fid, folder_id)
+                names = sorted((meta.get('name', '').lower(), fid) for fid, meta in by_id.items())
+                self._name_index = (self._version, names, by_id, parents)
+            return self._name_index[1:]
+
+    def sync(self, force=False):
+        """필요하면 전체 목록을 받거나 changes 피드의 변경분을 반영합니다"""
+        if not force and time.monotonic() - self._last_sync < SYNC_INTERVAL_SECONDS:
+            return
+        # 다른 스레드가 동기화 중이면 스냅샷이 있는 한 기다리지 않음
+        if not self._sync_lock.acquire(blocking=self._page_token is None):
+            return
+        try:
+            now = time.monotonic()
+            if not force and now - self._last_sync < SYNC_INTERVAL_SECONDS:
+                return
+            if self._page_token is None or now - self._last_full > FULL_RESYNC_SECONDS:
+                self._full_listing()
+            else:
+                try:
+                    self._apply_changes()
+                except Exception:
+                    # 토큰 만료 등으로 피드를 쓸 수 없으면 전체 목록으로 복구
+                    self._full_listing()
+            self._last_sync = time.monotonic()
+        finally:
+            self._sync_lock.release()
+
+    def _full_listing(self):
+        # 목록을 받는 동안의 변경을 놓치지 않도록 토큰을 먼저 받음
+        token = self._service.changes().getStartPageToken(supportsAllDrives=True).execute()['startPageToken']
+        with self._lock:
+            folder_ids = set(self._files) | set(self._root_ids)
+        with ThreadPoolExecutor(max_workers=LIST_WORKERS) as pool:
+            files = dict(zip(folder_ids, pool.map(self._list_all, folder_ids)))
+        with self._lock:
+            self._files = files
+            self._version += 1
+            # 그사이 새로 생긴 하위 폴더는 목록에 없으므로, 다음 build_tree()에서 빠진 폴더를 다시 확인
+            self._tree_built.clear()
+        self._page_token = token
+        self._last_full = time.monotonic()
+
+    def _list_all(self, folder_id):
+        files = {}
+        page_token = None
+        while True:
+            results = self._service.files().list(
+                q=f"'{folder_id}' in parents and trashed = false",
+                fields=f"nextPageToken, files({FILE_FIELDS}, parents)",
+                pageSize=1000,
+                pageToken=page_token,
+                supportsAllDrives=True,
+                includeItemsFromAllDrives=True,
+            ).execute()
+            for file in results.get('files', []):
+                files[file['id']] = file
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return files
+
+    def _apply_changes(self):
+        new_folders = []
+        page_token = self._page_token
+        while page_token:
+            results = self._service.changes().list(
+                pageToken=page_token,
+                fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({FILE_FIELDS}, parents, trashed))",
+                pageSize=1000,
+                supportsAllDrives=True,
+                includeItemsFromAllDrives=True,
+            ).execute()
+            with self._lock:
+                for change in results.get('changes', []):
+                    new_folders.extend(self._apply_change(change))
+                self._version += 1
+            if 'newStartPageToken' in results:
+                self._page_token = results['newStartPageToken']
+            page_token = results.get('nextPageToken')
+        # 추적 중인 폴더에 새로 생기거나 옮겨 온 하위 폴더는 내용까지 받아야 검색에 나옴
+        if new_folders:
+            self._list_tree(new_folders)
+
+    def _apply_change(self, change):
+        """변경 하나를 스냅샷에 반영하고, 목록을 새로 받아야 하는 하위 폴더 id 목록을 반환합니다"""
+        file_id = change.get('fileId')
+        # 다른 폴더로 옮겨졌거나 삭제된 경우를 위해 먼저 모든 폴더에서 제거
+        for files in self._files.values():
+            files.pop(file_id, None)
+        file = change.get('file')
+        if change.get('removed') or not file or file.get('trashed'):
+            # 삭제된 폴더의 하위 목록도 더 이상 추적하지 않음
+            self._files.pop(file_id, None)
+            return []
+        new_folders = []
+        for parent in file.get('parents', []):
+            if parent in self._files:
+                self._files[parent][file_id] = file
+                if file.get('mimeType') == FOLDER_MIME and file_id not in self._files:
+                    new_folders.append(file_id)
+        return new_folders
+
+
+def _path(file_id, by_id, parents):
+    parts = []
+    current = file_id
+    while current in by_id and len(parts) < 64:  # 순환 참조 방지
+        parts.append(by_id[current].get('name', ''))
+        current = parents[current]
+    return "/".join(reversed(parts))
+
+
+@st.cache_resource(show_spinner=False)
+def get_folder_index(*folder_ids):
+    """폴더 id 목록별로 서버 프로세스 전체에서 공유하는 인덱스"""
+    return FolderIndex(get_drive_service(), folder_ids)
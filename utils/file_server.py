@@ -0,0 +1,209 @@
+import os
+import re
+import secrets
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import streamlit as st
+
+CHUNK_SIZE = 256 * 1024
+# 발급한 다운로드 링크의 유효 시간
+LINK_TTL_SECONDS = 60 * 60
+
+RANGE_PATTERN = re.compile(r'bytes=(\d*)-(\d*)$')
+
+
+def _setting(name, default):
+    """st.secrets의 [file_server] 또는 FILE_SERVER_* 환경변수에서 설정을 읽습니다"""
+    try:
+        section = st.secrets.get("file_server", {})
+        if name in section:
+            return section[name]
+    except Exception:
+        pass
+    return os.environ.get(f"FILE_SERVER_{name.upper()}", default)
+
+
+class _Entry:
+    def __init__(self, path, filename, mime, delete_after):
+        self.path = Path(path)
+        self.filename = filename
+        self.mime = mime
+        self.delete_after = delete_after
+        self.expires_at = time.time() + LINK_TTL_SECONDS
+        # 지금까지 전송을 끝낸 바이트 구간 [(시작, 끝)] (겹치지 않게 병합해 둠)
+        self.sent = []
+
+    def mark_sent(self, start, end, size):
+        """start~end 전송을 기록하고, 파일 전체가 한 번 이상 전송됐는지 반환합니다"""
+        merged = []
+        for first, last in sorted(self.sent + [(start, end)]):
+            if merged and first <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+            else:
+                merged.append((first, last))
+        self.sent = merged
+        return merged == [(0, size - 1)]
+
+
+class FileServer:
+    """큰 파일을 디스크에서 청크 단위로 스트리밍하는 작은 HTTP 서버
+
+    st.download_button은 파일 전체를 서버 메모리에 올리기 때문에, 큰 결과 파일은
+    register()로 일회성 링크를 발급받아 이 서버로 내려받게 합니다. Range 요청을 지원하므로
+    이어받기가 되고, delete_after=True인 파일은 모든 바이트가 전송되면 지웁니다.
+    """
+
+    def __init__(self, host, port, public_url):
+        self.public_url = public_url.rstrip("/")
+        self._lock = threading.Lock()
+        self._entries = {}
+        server = self
+
+        class Handler(_RangeRequestHandler):
+            file_server = server
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, name="file-server", daemon=True).start()
+
+    def register(self, path, filename=None, mime="application/octet-stream", delete_after=False):
+        """path를 내려받을 수 있는 URL을 반환합니다"""
+        self._sweep()
+        token = secrets.token_urlsafe(24)
+        with self._lock:
+            self._entries[token] = _Entry(path, filename or Path(path).name, mime, delete_after)
+        return f"{self.public_url}/files/{token}"
+
+    def lookup(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+        if entry and entry.expires_at > time.time() and entry.path.exists():
+            return entry
+        return None
+
+    def transfer_complete(self, token, start, end, size):
+        """start~end 구간 전송이 끝났을 때 호출됩니다
+
+        delete_after 파일은 여러 요청(이어받기, 분할 다운로드)에 걸쳐서라도 모든 바이트가 전송된 뒤에만 지웁니다.
+        """
+        with self._lock:
+            entry = self._entries.get(token)
+            if not entry or not entry.delete_after or not entry.mark_sent(start, end, size):
+                return
+            del self._entries[token]
+        _unlink(entry.path)
+
+    def _sweep(self):
+        # 만료된 링크 정리 (일회성 파일은 함께 삭제)
+        now = time.time()
+        with self._lock:
+            expired = [token for token, entry in self._entries.items() if entry.expires_at <= now]
+            entries = [self._entries.pop(token) for token in expired]
+        for entry in entries:
+            if entry.delete_after:
+                _unlink(entry.path)
+
+
+class _RangeRequestHandler(BaseHTTPRequestHandler):
+    file_server = None
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body):
+        match = re.fullmatch(r'/files/([A-Za-z0-9_-]+)', urllib.parse.urlsplit(self.path).path)
+        entry = self.file_server.lookup(match.group(1)) if match else None
+        if entry is None:
+            self.send_error(404)
+            return
+        token = match.group(1)
+        size = entry.path.stat().st_size
+        start, end = 0, size - 1
+        status = 200
+        range_header = self.headers.get("Range")
+        if range_header:
+            range_match = RANGE_PATTERN.match(range_header.strip())
+            if not range_match or not any(range_match.groups()):
+                self._send_unsatisfiable(size)
+                return
+            first, last = range_match.groups()
+            if first:
+                start = int(first)
+                end = min(int(last), size - 1) if last else size - 1
+            else:
+                # bytes=-N : 마지막 N바이트
+                start = max(0, size - int(last))
+            if start > end or start >= size:
+                self._send_unsatisfiable(size)
+                return
+            status = 206
+
+        length = end - start + 1
+        quoted_name = urllib.parse.quote(entry.filename)
+        self.send_response(status)
+        self.send_header("Content-Type", entry.mime)
+        self.send_header("Content-Length", str(length))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Disposition", f"attachment; filename*=UTF-8''{quoted_name}")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if not send_body:
+            return
+
+        try:
+            with open(entry.path, "rb") as fh:
+                fh.seek(start)
+                remaining = length
+                while remaining > 0:
+                    chunk = fh.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            return  # 사용자가 중간에 취소 (이어받기 가능하도록 파일 유지)
+        if remaining == 0:
+            self.file_server.transfer_complete(token, start, end, size)
+
+    def _send_unsatisfiable(self, size):
+        self.send_response(416)
+        self.send_header("Content-Range", f"bytes */{size}")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass  # 요청마다 서버 로그를 남기지 않음
+
+
+def _unlink(path):
+    try:
+        Path(path).unlink()
+    except OSError:
+        pass
+
+
+@st.cache_resource(show_spinner=False)
+def get_file_server():
+    """서버 프로세스당 하나의 파일 서버 (설정하지 않았거나 시작할 수 없으면 None)
+
+    사용자가 이 포트에 직접 접속해야 하므로, 배포 환경에서 Streamlit 포트 외에 포트를 하나 더 열고
+    그 외부 주소를 [file_server] public_url(또는 FILE_SERVER_PUBLIC_URL)로 지정했을 때만 켭니다.
+    None이면 호출하는 쪽은 st.download_button으로 전달합니다.
+    """
+    public_url = _setting("public_url", "")
+    if not public_url:
+        return None
+    port = int(_setting("port", 8599))
+    try:
+        return FileServer(_setting("host", "0.0.0.0"), port, public_url)
+    except OSError as e:
+        print(f"File server could not start on port {port}: {e}") # 서버 로그용
+        return None
@@ -0,0 +1,72 @@
+import threading
+
+import google_auth_httplib2
+import gspread
+import httplib2
+import streamlit as st
+from google.auth.transport.requests import Request
+from google.oauth2.service_account import Credentials
+from googleapiclient.discovery import build
+from googleapiclient.http import HttpRequest
+
+# 모든 페이지가 같이 쓰는 스프레드시트
+SHEET_ID = "1Bx4otXnVjpWONjlOMAecK4l-y3CAzxyNmH-O0mcQY0E"  # 실제 사용 중인 시트 ID로 맞추세요
+
+# 페이지마다 따로 인증하지 않도록 필요한 범위를 한 번에 요청
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+
+# 여러 세션(스레드)이 동시에 토큰을 갱신하지 않도록 보호
+_refresh_lock = threading.Lock()
+
+
+@st.cache_resource(show_spinner=False)
+def get_credentials():
+    """서버 프로세스당 한 번만 서비스 계정 인증 정보를 만듭니다"""
+    return Credentials.from_service_account_info(
+        dict(st.secrets["google_service_account"]), scopes=SCOPES
+    )
+
+
+def ensure_fresh_credentials():
+    """토큰이 만료되었거나 곧 만료되면 한 스레드만 갱신하고 인증 정보를 반환합니다"""
+    credentials = get_credentials()
+    if not credentials.valid:
+        with _refresh_lock:
+            if not credentials.valid:
+                credentials.refresh(Request())
+    return credentials
+
+
+@st.cache_resource(show_spinner=False)
+def get_gspread_client():
+    """공유 gspread 클라이언트 (만료된 토큰은 내부 AuthorizedSession이 자동 갱신)"""
+    return gspread.authorize(get_credentials())
+
+
+@st.cache_resource(show_spinner=False)
+def get_spreadsheet():
+    """SHEET_ID 스프레드시트를 한 번만 열어 모든 세션이 공유합니다"""
+    return get_gspread_client().open_by_key(SHEET_ID)
+
+
+def _build_request(http, *args, **kwargs):
+    # httplib2.Http는 스레드에 안전하지 않으므로 요청마다 새 Http를 사용
+    ensure_fresh_credentials()
+    authorized_http = google_auth_httplib2.AuthorizedHttp(get_credentials(), http=httplib2.Http())
+    return HttpRequest(authorized_http, *args, **kwargs)
+
+
+@st.cache_resource(show_spinner=False)
+def get_drive_service():
+    """공유 Drive v3 서비스 (discovery 문서는 프로세스당 한 번만 로드)"""
+    authorized_http = google_auth_httplib2.AuthorizedHttp(get_credentials(), http=httplib2.Http())
+    return build(
+        "drive",
+        "v3",
+        http=authorized_http,
+        requestBuilder=_build_request,
+        cache_discovery=False,
+    )
@@ -0,0 +1,231 @@
+import itertools
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import streamlit as st
+
+# 서버 전체에서 동시에 실행하는 최대 작업 수 (묶음 작업의 하위 작업도 포함)
+MAX_WORKERS = 3
+# 사용자 한 명이 동시에 걸어둘 수 있는 최대 작업 수 (대기 포함)
+MAX_ACTIVE_PER_OWNER = 2
+# 끝난 작업 기록을 보관하는 시간
+FINISHED_JOB_TTL_SECONDS = 60 * 60
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+
+class JobCancelled(Exception):
+    """작업이 취소되었을 때 작업 함수 안에서 발생합니다"""
+
+
+class JobLimitError(Exception):
+    """동시 작업 수 제한을 넘었을 때 발생합니다"""
+
+
+class Job:
+    """백그라운드 작업 하나의 상태 (페이지는 이 값을 주기적으로 읽어 표시)
+
+    같은 key의 작업을 여러 사용자가 요청하면 하나의 작업을 함께 기다리므로 owners는 여러 명일 수 있습니다.
+    """
+
+    _seq = itertools.count(1)
+
+    def __init__(self, label, owner, key=None, cancel_event=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.seq = next(self._seq)
+        self.label = label
+        self.key = key
+        self.owners = {owner}
+        self.state = QUEUED
+        self.progress = 0.0
+        self.message = "대기 중..."
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.items = []  # 묶음 작업의 하위 작업들
+        self._cancel_event = cancel_event or threading.Event()
+        self._manager = None
+        # 작업이 받은 실행 자리를 하위 작업 하나가 쓰고 있는지
+        self._slot_lock = threading.Lock()
+        self._own_slot_busy = False
+
+    @property
+    def active(self):
+        return self.state in ACTIVE_STATES
+
+    @property
+    def cancel_requested(self):
+        return self._cancel_event.is_set()
+
+    def add_item(self, label):
+        """묶음 작업 안의 하위 작업을 만듭니다 (상위 작업이 취소되면 함께 취소됨)"""
+        item = Job(label, None, cancel_event=self._cancel_event)
+        self.items.append(item)
+        return item
+
+    def item_slot(self, item):
+        """하위 작업 하나를 실행할 자리를 잡는 컨텍스트 (JobManager.item_slot 참고)"""
+        return self._manager.item_slot(self, item)
+
+    def update(self, progress=None, message=None):
+        """작업 함수에서 진행 상황을 기록합니다 (취소 요청이 있으면 JobCancelled 발생)"""
+        if progress is not None:
+            self.progress = max(0.0, min(1.0, progress))
+        if message is not None:
+            self.message = message
+        self.check_cancelled()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+
+class JobManager:
+    """작업 수를 제한하는 워커 풀과 작업 목록
+
+    실행 자리(semaphore)는 max_workers개로, 작업 하나가 실행되는 동안 한 자리를 차지합니다. 묶음 작업이 하위 작업을
+    동시에 돌릴 때도 item_slot()으로 같은 자리를 나눠 쓰므로, 서버 전체의 동시 다운로드 수는 max_workers를 넘지 않습니다.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, max_active_per_owner=MAX_ACTIVE_PER_OWNER):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._slots = threading.Semaphore(max_workers)
+        self._max_active_per_owner = max_active_per_owner
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def submit(self, fn, label, owner, *args, key=None, **kwargs):
+        """fn(job, *args, **kwargs)를 워커 풀에서 실행할 작업으로 등록합니다
+
+        key가 같은 작업이 이미 진행 중이면 새로 실행하지 않고 그 작업에 owner를 추가해 반환합니다.
+        """
+        with self._lock:
+            self._prune()
+            if key is not None:
+                for job in self._jobs.values():
+                    if job.key == key and job.active and not job.cancel_requested:
+                        job.owners.add(owner)
+                        return job
+            active = sum(1 for job in self._jobs.values() if owner in job.owners and job.active)
+            if active >= self._max_active_per_owner:
+                raise JobLimitError(f"동시에 {self._max_active_per_owner}개까지만 작업할 수 있습니다.")
+            job = Job(label, owner, key)
+            job._manager = self
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        # 묶음 작업의 하위 작업이 자리를 쓰고 있으면 대기 상태로 기다림
+        while not self._slots.acquire(timeout=0.5):
+            if job.cancel_requested:
+                break
+        else:
+            try:
+                self._run_in_slot(job, fn, args, kwargs)
+            finally:
+                self._slots.release()
+            return
+        self._finish(job, CANCELLED, message="취소되었습니다.")
+
+    def _run_in_slot(self, job, fn, args, kwargs):
+        if job.cancel_requested:
+            self._finish(job, CANCELLED, message="취소되었습니다.")
+            return
+        job.state = RUNNING
+        try:
+            job.result = fn(job, *args, **kwargs)
+        except JobCancelled:
+            self._finish(job, CANCELLED, message="취소되었습니다.")
+        except Exception as e:
+            job.error = str(e)
+            self._finish(job, FAILED)
+            print(f"Job {job.id} ({job.label}) failed: {e}")  # 서버 로그용
+        else:
+            self._finish(job, DONE if job.result else FAILED)
+
+    @contextmanager
+    def item_slot(self, job, item):
+        """묶음 작업 job의 하위 작업 item을 실행할 자리를 잡습니다
+
+        먼저 job이 이미 차지한 자리를 쓰고, 그 자리가 사용 중이면 다른 작업과 같은 실행 자리를 기다립니다.
+        job 자리는 항상 하위 작업 하나가 쓸 수 있으므로 묶음 작업끼리 서로 막히지 않습니다.
+        """
+        shared = False
+        item.message = "다른 다운로드가 끝나기를 기다리는 중..."
+        while True:
+            with job._slot_lock:
+                if not job._own_slot_busy:
+                    job._own_slot_busy = True
+                    break
+            if self._slots.acquire(timeout=0.5):
+                shared = True
+                break
+            item.check_cancelled()
+        try:
+            yield
+        finally:
+            if shared:
+                self._slots.release()
+            else:
+                with job._slot_lock:
+                    job._own_slot_busy = False
+
+    @staticmethod
+    def _finish(job, state, message=None):
+        if message is not None:
+            job.message = message
+        job.finished_at = time.time()
+        job.state = state
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs_for(self, owner):
+        """owner의 작업 목록 (최근 것 먼저)"""
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if owner in job.owners]
+        return sorted(jobs, key=lambda job: job.seq, reverse=True)
+
+    def cancel(self, job_id, owner):
+        """owner의 작업 취소 요청
+
+        다른 사용자도 기다리는 작업이면 owner만 빠지고, 마지막 owner가 취소하면 작업을 멈춥니다
+        (대기 중이면 시작하지 않고, 실행 중이면 다음 진행 보고 때 멈춤).
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or not job.active:
+                return job
+            if len(job.owners) > 1:
+                job.owners.discard(owner)
+                return job
+            job._cancel_event.set()
+            job.message = "취소 요청됨..."
+        return job
+
+    def remove(self, job_id, owner):
+        """끝난 작업을 owner의 목록에서 지웁니다"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job and not job.active:
+                job.owners.discard(owner)
+                if not job.owners:
+                    del self._jobs[job_id]
+
+    def _prune(self):
+        cutoff = time.time() - FINISHED_JOB_TTL_SECONDS
+        for job_id in [jid for jid, job in self._jobs.items() if job.finished_at and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+
+@st.cache_resource(show_spinner=False)
+def get_job_manager():
+    """서버 프로세스 전체에서 공유하는 작업 관리자"""
+    return JobManager()
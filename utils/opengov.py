@@ -0,0 +1,348 @@
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 정보공개포털 원문정보 목록 조회
+LANDING_URL = "https://www.open.go.kr/othicInfo/infoList/orginlInfoList.do"
+LIST_URL = "https://www.open.go.kr/othicInfo/infoList/orginlInfoList.ajax"
+# 모든 요청에 공통으로 보내는 브라우저 헤더
+SESSION_HEADERS = {
+    "Accept-Language": "ko-KR,ko;q=0.9,en-US;q=0.8,en;q=0.7",
+    "DNT": "1",
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/136.0.0.0 Safari/537.36",
+    "sec-ch-ua": '"Chromium";v="136", "Google Chrome";v="136", "Not.A/Brand";v="99"',
+    "sec-ch-ua-mobile": "?0",
+    "sec-ch-ua-platform": '"Windows"',
+}
+# 목록 조회(ajax) 요청에만 보내는 헤더
+HEADERS = {
+    "Accept": "application/json, text/javascript, */*; q=0.01",
+    "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
+    "Origin": "https://www.open.go.kr",
+    "Referer": LANDING_URL,
+    "X-Requested-With": "XMLHttpRequest",
+}
+REQUEST_TIMEOUT = 30
+# 일시적인 오류(연결 실패, 5xx, 429)는 0.5s, 1s, 2s 간격으로 다시 시도
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5
+RETRY_STATUS = (429, 500, 502, 503, 504)
+# 세션 쿠키는 이 시간이 지나면 첫 페이지에서 새로 받음 (만료되면 그 전에라도 다시 받음)
+SESSION_MAX_AGE = 30 * 60
+# 서버 프로세스 전체에서 동시에 보내는 최대 요청 수 (사이트에 부담을 주지 않도록 작게 유지, 세션이 여러 개여도 공유)
+MAX_CONCURRENT_REQUESTS = 4
+# 한 페이지에 받는 행 수 (사이트 최대값)
+ROWS_PER_PAGE = 1000
+# 첫 페이지 result에서 전체 건수를 담고 있을 수 있는 키
+TOTAL_COUNT_KEYS = ("rtnTotal", "totalCnt", "totCnt", "totalCount")
+
+DISPLAY_COLUMNS = ["DOC_NO", "LAST_UPDT_DT", "INFO_SJ", "FILE_NM", "CHARGER_NM"]
+
+
+class SessionExpired(ValueError):
+    """세션이 만료되어 목록 조회가 JSON 대신 다른 응답을 돌려준 경우"""
+
+
+class OpenGovClient:
+    """정보공개포털과 연결을 유지하는 클라이언트
+
+    keep-alive 연결 풀을 쓰는 requests.Session 하나를 여러 작업 스레드가 공유합니다. 쿠키(JSESSIONID 등)는
+    첫 페이지를 열어 직접 받고, 만료되면 다시 받습니다. 요청 수와 지연 시간은 stats()로 확인할 수 있습니다.
+    """
+
+    def __init__(self, pool_size=None):
+        pool_size = pool_size or MAX_CONCURRENT_REQUESTS
+        retry = Retry(
+            total=MAX_RETRIES,
+            backoff_factor=RETRY_BACKOFF,
+            status_forcelist=RETRY_STATUS,
+            allowed_methods=None,  # 목록 조회 POST도 읽기 전용이므로 재시도
+            raise_on_status=False,
+        )
+        self.session = requests.Session()
+        self.session.headers.update(SESSION_HEADERS)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("https://", adapter)
+        # 모든 세션의 조회가 이 클라이언트를 공유하므로, 여기서 프로세스 전체 동시 요청 수를 제한
+        self._request_slots = threading.BoundedSemaphore(pool_size)
+        self._session_lock = threading.Lock()
+        self._session_started = 0.0
+        self._session_generation = 0  # 쿠키를 새로 받을 때마다 증가
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "errors": 0, "bootstraps": 0, "total_seconds": 0.0, "max_seconds": 0.0, "last_seconds": 0.0}
+
+    def _record(self, key, seconds=None):
+        with self._stats_lock:
+            self._stats[key] += 1
+            if seconds is not None:
+                self._stats["total_seconds"] += seconds
+                self._stats["last_seconds"] = seconds
+                self._stats["max_seconds"] = max(self._stats["max_seconds"], seconds)
+
+    def _bootstrap(self, expired_generation=None):
+        """첫 페이지를 열어 세션 쿠키를 받습니다 (이미 유효하면 건너뜀)
+
+        expired_generation은 만료를 확인한 요청이 사용한 세션 세대입니다. 그사이 다른 스레드가 이미 쿠키를
+        새로 받았으면 다시 받지 않아, 동시에 실패한 요청들이 방금 받은 쿠키를 서로 지우지 않게 합니다.
+        """
+        with self._session_lock:
+            if expired_generation is not None:
+                if expired_generation != self._session_generation:
+                    return
+            elif time.monotonic() - self._session_started < SESSION_MAX_AGE:
+                return
+            self.session.cookies.clear()
+            with self._request_slots:
+                response = self.session.get(LANDING_URL, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+            self._session_started = time.monotonic()
+            self._session_generation += 1
+            self._record("bootstraps")
+            print(f"정보공개포털 세션 쿠키 갱신: {sorted(self.session.cookies.keys())}")  # 서버 로그용
+
+    def _post_once(self, data):
+        with self._request_slots:
+            # 지연 시간은 자리를 기다린 시간을 빼고 요청에 걸린 시간만 기록
+            started = time.perf_counter()
+            try:
+                response = self.session.post(LIST_URL, headers=HEADERS, data=data, timeout=REQUEST_TIMEOUT)
+                response.raise_for_status()
+                try:
+                    return response.json()
+                except ValueError:
+                    # 세션이 만료되면 JSON 대신 HTML(안내 페이지)이 돌아옴
+                    raise SessionExpired(f"목록 조회 응답이 JSON이 아닙니다 (HTTP {response.status_code})")
+            except (requests.RequestException, ValueError):
+                self._record("errors")
+                raise
+            finally:
+                self._record("requests", time.perf_counter() - started)
+
+    def post_list(self, data):
+        """목록 조회 요청을 보내 JSON을 반환합니다 (세션이 만료됐으면 쿠키를 새로 받아 한 번 더 시도)"""
+        self._bootstrap()
+        generation = self._session_generation
+        try:
+            return self._post_once(data)
+        except SessionExpired:
+            pass
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code not in (401, 403):
+                raise
+        self._bootstrap(expired_generation=generation)
+        return self._post_once(data)
+
+    def stats(self):
+        """요청 수, 오류 수, 쿠키 갱신 횟수와 지연 시간(초) 통계"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["avg_seconds"] = stats["total_seconds"] / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """서버 프로세스 전체에서 공유하는 클라이언트 (작업 스레드에서도 호출하므로 st.cache_resource 대신 모듈 전역)"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OpenGovClient()
+        return _client
+
+
+# 기관별 진행 상황: rows는 새로 도착한 행, done이면 해당 기관 조회가 끝난 것
+FetchEvent = namedtuple("FetchEvent", "institution rows fetched total error done")
+# 받는 쪽이 처리하지 못한 이벤트를 이 수 이상 쌓지 않음 (행이 메모리에 쌓이지 않도록)
+MAX_PENDING_EVENTS = 16
+
+
+class _FetchAbandoned(Exception):
+    """iter_many를 끝까지 읽지 않고 그만둔 경우 (화면 재실행 등)"""
+
+
+class _EventQueue:
+    """작업 스레드에서 호출한 스레드로 FetchEvent를 넘기는 큐
+
+    가득 차면 작업 스레드가 기다리고, 받는 쪽이 close()하면 더 기다리지 않고 작업을 멈춥니다.
+    """
+
+    def __init__(self, maxsize=MAX_PENDING_EVENTS):
+        self._queue = queue.Queue(maxsize)
+        self._closed = threading.Event()
+
+    def put(self, event):
+        while not self._closed.is_set():
+            try:
+                self._queue.put(event, timeout=0.5)
+                return
+            except queue.Full:
+                pass
+        raise _FetchAbandoned()
+
+    def get(self):
+        return self._queue.get()
+
+    def close(self):
+        self._closed.set()
+
+    @property
+    def closed(self):
+        return self._closed.is_set()
+
+
+def _total_count(result):
+    """첫 페이지 메타데이터의 전체 건수 (없으면 None)"""
+    for key in TOTAL_COUNT_KEYS:
+        value = result.get(key)
+        if value not in (None, ""):
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                pass
+    return None
+
+
+def fetch_page(institution, start_date, end_date, page):
+    """원문정보 목록의 한 페이지를 가져와 result 딕셔너리를 반환합니다
+
+    institution은 {"name": ..., "code": ...} 입니다. 요청이 실패하면 requests 예외가 발생합니다.
+    """
+    data = {
+        "kwd": "",
+        "searchInsttCdNmPop": institution["name"],
+        "preKwds": "",
+        "reSrchFlag": "off",
+        "othbcSeCd": "",
+        "insttSeCd": "",
+        "eduYn": "Y",
+        "startDate": start_date.strftime("%Y%m%d"),
+        "endDate": end_date.strftime("%Y%m%d"),
+        "insttCdNm": institution["name"],
+        "insttCd": institution["code"],
+        "searchMainYn": "",
+        "viewPage": str(page),
+        "rowPage": str(ROWS_PER_PAGE),
+        "sort": "s",
+        "url": "/othicInfo/infoList/orginlInfoList.ajax",
+        "callBackFn": "searchFn_callBack"
+    }
+    body = get_client().post_list(data)
+    result = body.get("result") if isinstance(body, dict) else None
+    if result is not None and not isinstance(result, dict):
+        raise ValueError(f"목록 조회 응답 형식이 올바르지 않습니다: {type(result).__name__}")
+    return result or {}
+
+
+def iter_pages(institution, start_date, end_date):
+    """결과가 없을 때까지 페이지를 따라가며 (행 목록, 전체 건수)를 페이지마다 반환합니다
+
+    전체 건수는 첫 페이지 메타데이터에서 가져오며, 없으면 None입니다.
+    """
+    page, fetched, total = 1, 0, None
+    while True:
+        result = fetch_page(institution, start_date, end_date, page)
+        rows = result.get("rtnList") or []
+        if page == 1:
+            total = _total_count(result)
+        if not rows:
+            return
+        fetched += len(rows)
+        yield rows, total
+        if len(rows) < ROWS_PER_PAGE or (total is not None and fetched >= total):
+            return
+        page += 1
+
+
+def _fetch_into(events, institution, start_date, end_date, store=None, batch_rows=None):
+    """기관 하나를 조회하며 진행 상황을 events 큐에 넣습니다 (작업 스레드에서 실행)
+
+    어떤 예외가 나더라도 마지막에 done 이벤트를 넣어, iter_many가 끝없이 기다리지 않게 합니다.
+    """
+    if events.closed:
+        return  # 받는 쪽이 이미 그만뒀으면 요청을 보내지 않음
+    fetched, error = 0, None
+    try:
+        if store is None:
+            for rows, total in iter_pages(institution, start_date, end_date):
+                fetched += len(rows)
+                events.put(FetchEvent(institution, rows, fetched, total, None, False))
+        else:
+            # 이미 받은 구간은 저장소에서 읽고, 빠진 구간은 원격에서 받는 대로 바로 넘기며 저장 (최신 구간부터)
+            # 행은 페이지/배치 단위로만 메모리에 두고 바로 넘김
+            code = institution["code"]
+            load_args = (batch_rows,) if batch_rows else ()
+            with store.sync_lock(code):
+                plan = list(reversed(store.plan_ranges(code, start_date, end_date)))
+                expected = sum(store.count(code, first, last) for first, last, needs_fetch in plan if not needs_fetch)
+                for range_start, range_end, needs_fetch in plan:
+                    if not needs_fetch:
+                        for rows in store.load(code, range_start, range_end, *load_args):
+                            fetched += len(rows)
+                            events.put(FetchEvent(institution, rows, fetched, expected, None, False))
+                        continue
+                    store.clear_range(code, range_start, range_end)
+                    received, base = 0, expected
+                    for rows, total in iter_pages(institution, range_start, range_end):
+                        store.add_rows(code, range_start, range_end, rows)
+                        received += len(rows)
+                        fetched += len(rows)
+                        # 전체 건수를 모르면 지금까지 받은 만큼만 예상치에 더함
+                        expected = base + (total if total is not None else received)
+                        events.put(FetchEvent(institution, rows, fetched, expected, None, False))
+                    store.mark_synced(code, range_start, range_end)
+                    expected = base + received
+    except _FetchAbandoned:
+        return
+    except (requests.RequestException, ValueError) as e:
+        error = str(e)
+    except Exception as e:
+        # 저장소 오류(sqlite3.OperationalError 등)나 예상하지 못한 응답 형식
+        print(f"{institution['name']} 공문 조회 중 오류: {e!r}")  # 서버 로그용
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        try:
+            events.put(FetchEvent(institution, [], fetched if error else None, None, error, True))
+        except _FetchAbandoned:
+            pass
+
+
+def iter_many(institutions, start_date, end_date, max_workers=MAX_CONCURRENT_REQUESTS, store=None, batch_rows=None):
+    """여러 기관을 동시에 조회하며 FetchEvent를 도착하는 순서대로 반환합니다
+
+    요청은 작업 스레드에서 보내지만 이벤트는 호출한 스레드에서 받으므로, 화면을 바로 갱신할 수 있습니다.
+    store(DocumentStore)를 주면 이미 받은 날짜는 로컬에서 batch_rows개씩 읽습니다. 받는 쪽이 느리면
+    작업 스레드가 기다리므로, 한 번에 메모리에 있는 행은 이벤트 MAX_PENDING_EVENTS개 분량으로 제한됩니다.
+    """
+    events = _EventQueue()
+    remaining = len(institutions)
+    pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(institutions) or 1)))
+    try:
+        for institution in institutions:
+            pool.submit(_fetch_into, events, institution, start_date, end_date, store, batch_rows)
+        while remaining:
+            event = events.get()
+            if event.done:
+                remaining -= 1
+            yield event
+    finally:
+        # 중간에 그만두면(화면 재실행, 내보내기 중단) 기다리던 작업 스레드를 풀어 주고, 시작하지 않은 기관은 취소함.
+        # 요청 중인 스레드는 그 요청이 끝나면 스스로 멈추므로 기다리지 않음
+        events.close()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def to_frame(institution, rows):
+    """행 목록을 기관 이름 INSTITUTION 열이 붙은 DataFrame으로 만듭니다"""
+    frame = pd.DataFrame(rows)
+    frame.insert(0, "INSTITUTION", institution["name"])
+    return frame
@@ -0,0 +1,89 @@
+import csv
+
+from utils.opengov import DISPLAY_COLUMNS, MAX_CONCURRENT_REQUESTS, iter_many
+
+# Parquet 내보내기는 pyarrow가 있을 때만 사용 (없으면 CSV만)
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+EXPORT_COLUMNS = ["INSTITUTION"] + DISPLAY_COLUMNS
+# 이만큼 모이면 파일에 씀 (Parquet은 행 그룹 하나)
+EXPORT_BATCH_ROWS = 5000
+# 형식 이름: (확장자, MIME)
+EXPORT_FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+
+def available_formats():
+    """이 서버에서 사용할 수 있는 내보내기 형식 목록"""
+    return [name for name in EXPORT_FORMATS if name != "Parquet" or pq is not None]
+
+
+class _CsvWriter:
+    def __init__(self, path):
+        # 엑셀에서 한글이 깨지지 않도록 BOM을 붙임
+        self._file = open(path, "w", newline="", encoding="utf-8-sig")
+        self._writer = csv.DictWriter(self._file, fieldnames=EXPORT_COLUMNS, restval="", extrasaction="ignore")
+        self._writer.writeheader()
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetWriter:
+    def __init__(self, path):
+        self._schema = pa.schema([(column, pa.string()) for column in EXPORT_COLUMNS])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write(self, rows):
+        columns = {
+            column: [None if row.get(column) is None else str(row[column]) for row in rows]
+            for column in EXPORT_COLUMNS
+        }
+        self._writer.write_table(pa.table(columns, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def export_documents(path, fmt, institutions, start_date, end_date, store=None, on_progress=None):
+    """선택한 기관/기간의 공문 목록을 DataFrame을 만들지 않고 바로 파일로 씁니다
+
+    조회 결과를 EXPORT_BATCH_ROWS 행씩 모아 CSV 또는 Parquet 파일에 이어 씁니다. 실패한 기관이 있어도
+    나머지는 계속 쓰며, 실패하기 전까지 받은 행은 파일에 남습니다(일부만 포함). on_progress(쓴 행 수)는
+    호출한 스레드에서 불립니다. (쓴 행 수, {기관 이름: 오류 메시지}, {기관 이름: 파일에 쓴 행 수})를 반환합니다.
+    """
+    if fmt not in available_formats():
+        raise ValueError(f"사용할 수 없는 내보내기 형식입니다: {fmt}")
+    writer = _ParquetWriter(path) if fmt == "Parquet" else _CsvWriter(path)
+    batch, written, errors, rows_by_institution = [], 0, {}, {}
+    try:
+        for event in iter_many(institutions, start_date, end_date, MAX_CONCURRENT_REQUESTS, store, EXPORT_BATCH_ROWS):
+            if event.error:
+                errors[event.institution["name"]] = event.error
+            for row in event.rows:
+                batch.append(dict(row, INSTITUTION=event.institution["name"]))
+            name = event.institution["name"]
+            rows_by_institution[name] = rows_by_institution.get(name, 0) + len(event.rows)
+            if len(batch) >= EXPORT_BATCH_ROWS:
+                writer.write(batch)
+                written += len(batch)
+                batch = []
+                if on_progress:
+                    on_progress(written)
+        if batch:
+            writer.write(batch)
+            written += len(batch)
+            if on_progress:
+                on_progress(written)
+    finally:
+        writer.close()
+    return written, errors, rows_by_institution
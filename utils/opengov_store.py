@@ -0,0 +1,237 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import defaultdict
+from contextlib import closing
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import streamlit as st
+
+DB_PATH = Path(os.environ.get("OPENGOV_DB_PATH", Path(tempfile.gettempdir()) / "opengov_documents.sqlite3"))
+# 최근 며칠은 공문이 늦게 올라오므로 이미 받았어도 다시 조회
+RECENT_DAYS = 3
+# 행의 날짜로 사용할 필드 (앞에 있는 것 우선)
+DATE_FIELDS = ("PRDCTN_DT", "LAST_UPDT_DT")
+# 키워드 검색 대상 필드 (제목, 첨부파일명, 담당자)
+SEARCH_FIELDS = ("INFO_SJ", "FILE_NM", "CHARGER_NM")
+# trigram 색인은 3글자 이상부터 MATCH로 찾을 수 있음 (짧은 검색어는 LIKE로 찾음)
+MIN_MATCH_LENGTH = 3
+SEARCH_LIMIT = 500
+# load()가 한 번에 읽어 넘기는 행 수
+LOAD_BATCH_ROWS = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    instt_cd TEXT NOT NULL,
+    day TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_instt_day ON documents (instt_cd, day);
+CREATE TABLE IF NOT EXISTS synced_days (
+    instt_cd TEXT NOT NULL,
+    day TEXT NOT NULL,
+    synced_at TEXT NOT NULL,
+    PRIMARY KEY (instt_cd, day)
+);
+"""
+
+# 한국어는 띄어쓰기 단위 토큰화가 맞지 않으므로 trigram 토크나이저 사용 (SQLite 3.34 이상)
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE documents_fts USING fts5 (
+    info_sj, file_nm, charger_nm, tokenize = 'trigram'
+);
+INSERT INTO documents_fts (rowid, info_sj, file_nm, charger_nm)
+    SELECT id, json_extract(data, '$.INFO_SJ'), json_extract(data, '$.FILE_NM'), json_extract(data, '$.CHARGER_NM')
+    FROM documents;
+"""
+
+
+def _day(d):
+    return d.strftime("%Y%m%d")
+
+
+def _search_values(row):
+    return tuple(str(row.get(field) or "") for field in SEARCH_FIELDS)
+
+
+def _row_day(row, start, end):
+    """행의 날짜(YYYYMMDD)를 구합니다 (조회 구간을 벗어나면 구간 시작일로)"""
+    for field in DATE_FIELDS:
+        digits = "".join(ch for ch in str(row.get(field) or "") if ch.isdigit())[:8]
+        if len(digits) == 8 and _day(start) <= digits <= _day(end):
+            return digits
+    return _day(start)
+
+
+class DocumentStore:
+    """open.go.kr에서 받은 rtnList 행을 기관/날짜별로 보관하는 로컬 SQLite 저장소
+
+    지난 날짜의 공문 목록은 바뀌지 않으므로, 조회할 때 아직 받지 않은 날짜와 최근 며칠만
+    원격에서 가져오고 나머지는 로컬에서 읽습니다.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._write_lock = threading.Lock()
+        # 같은 기관을 여러 세션이 동시에 동기화하지 않도록 기관별 잠금
+        self._sync_locks = defaultdict(threading.Lock)
+        self._sync_locks_lock = threading.Lock()
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self.has_fts = self._ensure_fts(conn)
+
+    @staticmethod
+    def _ensure_fts(conn):
+        """전문 검색 색인을 만들고 (기존 행도 색인), 사용할 수 있는지 반환합니다"""
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'documents_fts'").fetchone():
+            return True
+        try:
+            conn.executescript(FTS_SCHEMA)
+            return True
+        except sqlite3.OperationalError as e:
+            # FTS5/trigram을 지원하지 않는 SQLite면 LIKE 검색으로 대신함
+            print(f"전문 검색 색인을 만들 수 없어 LIKE 검색을 사용합니다: {e}")  # 서버 로그용
+            return False
+
+    def _connect(self):
+        # 스레드마다 연결을 따로 사용 (with closing(...)으로 감싸 바로 닫음, 쓰기는 with conn으로 커밋까지)
+        return sqlite3.connect(self.path, timeout=30)
+
+    def plan_ranges(self, instt_cd, start, end, today=None):
+        """start~end를 연속된 날짜 구간으로 나눠 [(시작, 끝, 원격 조회 필요 여부)]를 날짜순으로 반환합니다"""
+        today = today or date.today()
+        recent_from = today - timedelta(days=RECENT_DAYS)
+        with closing(self._connect()) as conn:
+            synced = {
+                row[0] for row in conn.execute(
+                    "SELECT day FROM synced_days WHERE instt_cd = ? AND day BETWEEN ? AND ?",
+                    (instt_cd, _day(start), _day(end)),
+                )
+            }
+        ranges = []
+        current = start
+        while current <= end:
+            needs_fetch = _day(current) not in synced or current >= recent_from
+            if ranges and ranges[-1][2] == needs_fetch:
+                ranges[-1] = (ranges[-1][0], current, needs_fetch)
+            else:
+                ranges.append((current, current, needs_fetch))
+            current += timedelta(days=1)
+        return ranges
+
+    def sync_lock(self, instt_cd):
+        """기관 하나의 동기화(구간 비우기 → 행 추가 → 완료 표시)를 감싸는 잠금"""
+        with self._sync_locks_lock:
+            return self._sync_locks[instt_cd]
+
+    def clear_range(self, instt_cd, start, end):
+        """start~end 구간의 저장된 행을 지웁니다 (새로 받기 전에 호출)"""
+        with self._write_lock, closing(self._connect()) as conn, conn:
+            range_args = (instt_cd, _day(start), _day(end))
+            if self.has_fts:
+                conn.execute(
+                    "DELETE FROM documents_fts WHERE rowid IN "
+                    "(SELECT id FROM documents WHERE instt_cd = ? AND day BETWEEN ? AND ?)",
+                    range_args,
+                )
+            conn.execute("DELETE FROM documents WHERE instt_cd = ? AND day BETWEEN ? AND ?", range_args)
+
+    def add_rows(self, instt_cd, start, end, rows):
+        """start~end 구간에서 받은 행 일부(한 페이지)를 저장합니다"""
+        with self._write_lock, closing(self._connect()) as conn, conn:
+            for row in rows:
+                cursor = conn.execute(
+                    "INSERT INTO documents (instt_cd, day, data) VALUES (?, ?, ?)",
+                    (instt_cd, _row_day(row, start, end), json.dumps(row, ensure_ascii=False)),
+                )
+                if self.has_fts:
+                    conn.execute(
+                        "INSERT INTO documents_fts (rowid, info_sj, file_nm, charger_nm) VALUES (?, ?, ?, ?)",
+                        (cursor.lastrowid,) + _search_values(row),
+                    )
+
+    def mark_synced(self, instt_cd, start, end):
+        """start~end 구간을 끝까지 받았다고 표시합니다 (중간에 실패하면 표시하지 않아 다음에 다시 받음)"""
+        synced_at = datetime.now().isoformat(timespec="seconds")
+        days = []
+        current = start
+        while current <= end:
+            days.append((instt_cd, _day(current), synced_at))
+            current += timedelta(days=1)
+        with self._write_lock, closing(self._connect()) as conn, conn:
+            conn.executemany("INSERT OR REPLACE INTO synced_days (instt_cd, day, synced_at) VALUES (?, ?, ?)", days)
+
+    def count(self, instt_cd, start, end):
+        """start~end 구간의 저장된 행 수"""
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM documents WHERE instt_cd = ? AND day BETWEEN ? AND ?",
+                (instt_cd, _day(start), _day(end)),
+            ).fetchone()[0]
+
+    def load(self, instt_cd, start, end, batch_size=LOAD_BATCH_ROWS):
+        """start~end 구간의 저장된 행을 batch_size개씩 목록으로 반환하는 제너레이터
+
+        구간 전체를 메모리에 올리지 않도록 커서에서 fetchmany로 나눠 읽습니다.
+        """
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "SELECT data FROM documents WHERE instt_cd = ? AND day BETWEEN ? AND ? ORDER BY day DESC, id",
+                (instt_cd, _day(start), _day(end)),
+            )
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    return
+                yield [json.loads(row[0]) for row in batch]
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """저장된 모든 기관의 공문을 제목/첨부파일명/담당자로 검색합니다
+
+        띄어쓰기로 나눈 검색어를 모두 포함하는 행을 최신 날짜순으로 반환하며, 각 행에는 기관 코드
+        INSTT_CD가 추가됩니다. 원격 사이트에는 요청하지 않습니다.
+        """
+        terms = query.split()
+        if not terms:
+            return []
+        if self.has_fts:
+            columns = ("documents_fts.info_sj", "documents_fts.file_nm", "documents_fts.charger_nm")
+            source = "documents AS d JOIN documents_fts ON documents_fts.rowid = d.id"
+        else:
+            columns = tuple(f"json_extract(d.data, '$.{field}')" for field in SEARCH_FIELDS)
+            source = "documents AS d"
+        conditions, args = [], []
+        match_terms = [term for term in terms if self.has_fts and len(term) >= MIN_MATCH_LENGTH]
+        if match_terms:
+            # 따옴표로 감싸 FTS 연산자로 해석되지 않게 함
+            conditions.append("documents_fts MATCH ?")
+            args.append(" AND ".join('"' + term.replace('"', '""') + '"' for term in match_terms))
+        for term in terms:
+            if term in match_terms:
+                continue
+            escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            conditions.append("(" + " OR ".join(f"{column} LIKE ? ESCAPE '\\'" for column in columns) + ")")
+            args.extend([f"%{escaped}%"] * len(columns))
+        sql = (
+            f"SELECT d.instt_cd, d.data FROM {source} WHERE {' AND '.join(conditions)} "
+            "ORDER BY d.day DESC, d.id LIMIT ?"
+        )
+        with closing(self._connect()) as conn:
+            results = []
+            for instt_cd, data in conn.execute(sql, args + [limit]):
+                row = json.loads(data)
+                row["INSTT_CD"] = instt_cd
+                results.append(row)
+            return results
+
+
+@st.cache_resource(show_spinner=False)
+def get_document_store():
+    """서버 프로세스 전체에서 공유하는 공문 저장소"""
+    return DocumentStore()
@@ -0,0 +1,217 @@
+import threading
+import time
+
+import streamlit as st
+from gspread.utils import rowcol_to_a1
+
+from utils.google_clients import get_spreadsheet
+
+# 제어용 시트는 하루 몇 번만 바뀌므로 읽기 결과를 잠시 재사용
+RECORDS_TTL_SECONDS = 300
+
+REGISTRATION_PENDING = "대기중"
+REGISTRATION_APPROVED = "승인"
+
+
+class SheetRepository:
+    """board_roles, LoginList, registration, students 같은 제어용 워크시트의 읽기 캐시
+
+    모든 세션이 공유하며, 앱이 직접 쓰는 경우에는 해당 시트의 캐시를 바로 비웁니다.
+    """
+
+    def __init__(self, spreadsheet, ttl=RECORDS_TTL_SECONDS):
+        self._sh = spreadsheet
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._worksheets = {}
+        self._records = {}  # title -> (만료시각, records)
+        self._fetch_locks = {}
+        self._indexes = {}  # name -> (인덱스를 만든 records, index)
+
+    def worksheet(self, title):
+        """워크시트 핸들을 캐시해서 반환합니다 (없으면 WorksheetNotFound)"""
+        with self._lock:
+            ws = self._worksheets.get(title)
+        if ws is None:
+            ws = self._sh.worksheet(title)
+            with self._lock:
+                self._worksheets[title] = ws
+        return ws
+
+    def add_worksheet(self, title, rows, cols, header=None):
+        """워크시트를 새로 만들고 헤더를 기록합니다"""
+        ws = self._sh.add_worksheet(title=title, rows=rows, cols=cols)
+        if header:
+            ws.append_row(header)
+        with self._lock:
+            self._worksheets[title] = ws
+        self.invalidate(title)
+        return ws
+
+    def get_records(self, title):
+        """get_all_records() 결과를 TTL 동안 재사용합니다"""
+        cached = self._cached(title)
+        if cached is not None:
+            return cached
+        # 같은 시트를 여러 세션이 동시에 읽으려 할 때 한 번만 가져옴
+        with self._lock:
+            fetch_lock = self._fetch_locks.setdefault(title, threading.Lock())
+        with fetch_lock:
+            cached = self._cached(title)
+            if cached is not None:
+                return cached
+            records = self.worksheet(title).get_all_records()
+            with self._lock:
+                self._records[title] = (time.monotonic() + self._ttl, records)
+            return records
+
+    def _cached(self, title):
+        with self._lock:
+            entry = self._records.get(title)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def get_role(self, email):
+        """LoginList에서 email의 권한을 O(1)로 찾습니다 (등록되지 않았으면 None)"""
+        return self._get_role_index().get(_normalize_email(email))
+
+    def has_registration(self, email):
+        """registration 시트에 email의 신청이 이미 있는지 O(1)로 확인합니다"""
+        return _normalize_email(email) in self._get_index("registration", "registration", _build_email_set)
+
+    def _get_role_index(self):
+        return self._get_index("role", "LoginList", _build_role_index)
+
+    def _get_index(self, name, title, build):
+        records = self.get_records(title)
+        with self._lock:
+            built_from, index = self._indexes.get(name, (None, None))
+            # 시트를 새로 읽어온 경우에만 인덱스를 다시 만듦
+            if built_from is not records:
+                index = build(records)
+                self._indexes[name] = (records, index)
+            return index
+
+    def pending_registrations(self):
+        """처리상태가 대기중인 등록 신청 목록"""
+        return [row for row in self.get_records("registration") if row.get("처리상태") == REGISTRATION_PENDING]
+
+    def approve_registrations(self, approvals):
+        """대기중인 신청을 LoginList로 옮기고 처리상태를 승인으로 바꿉니다
+
+        approvals는 {email: role} 입니다. 인원 수와 관계없이 LoginList 추가 한 번,
+        registration 상태 변경 한 번의 요청으로 처리하며, 승인된 email 목록을 반환합니다.
+        """
+        approvals = {_normalize_email(email): role for email, role in approvals.items() if role}
+        if not approvals:
+            return []
+        reg_ws = self.worksheet("registration")
+        reg_values = reg_ws.get_all_values()
+        if not reg_values:
+            return []
+        header = reg_values[0]
+        email_col, name_col, status_col = header.index("email"), header.index("name"), header.index("처리상태")
+
+        login_ws = self.worksheet("LoginList")
+        login_header = login_ws.row_values(1)
+        registered = self._get_role_index()
+
+        new_logins, status_updates, approved = [], [], []
+        for row_number, row in enumerate(reg_values[1:], start=2):
+            row = row + [""] * (len(header) - len(row))
+            email = _normalize_email(row[email_col])
+            if email not in approvals or row[status_col] != REGISTRATION_PENDING or email in approved:
+                continue
+            if email not in registered:
+                fields = {"email": row[email_col].strip(), "role": approvals[email], "name": row[name_col]}
+                new_logins.append([fields.get(col, "") for col in login_header])
+            status_updates.append({"range": rowcol_to_a1(row_number, status_col + 1), "values": [[REGISTRATION_APPROVED]]})
+            approved.append(email)
+
+        if new_logins:
+            login_ws.append_rows(new_logins, value_input_option="RAW")
+            self.invalidate("LoginList")
+        if status_updates:
+            reg_ws.batch_update(status_updates, value_input_option="RAW")
+            self.invalidate("registration")
+        return approved
+
+    def append_row(self, title, row):
+        """행을 추가하고 해당 시트의 캐시를 비웁니다"""
+        self.worksheet(title).append_row(row)
+        self.invalidate(title)
+
+    def write_table(self, title, header, rows):
+        """시트 내용을 header + rows로 맞춥니다
+
+        현재 값과 비교해 바뀐 셀만 하나의 batch_update 요청으로 씁니다.
+        clear() 후 다시 쓰지 않으므로 저장 중에도 읽는 쪽이 빈 시트를 보지 않습니다.
+        바뀐 셀 수를 반환합니다.
+        """
+        ws = self.worksheet(title)
+        current = ws.get_all_values()
+        desired = [[str(v) for v in header]] + [[str(v) for v in row] for row in rows]
+        updates = _diff_cells(current, desired)
+        if updates:
+            if len(desired) > ws.row_count:
+                ws.add_rows(len(desired) - ws.row_count)
+            ws.batch_update(updates, value_input_option="RAW")
+        self.invalidate(title)
+        return sum(len(u["values"][0]) for u in updates)
+
+    def invalidate(self, title=None):
+        """title의 캐시를 비웁니다 (None이면 전체)"""
+        with self._lock:
+            if title is None:
+                self._records.clear()
+            else:
+                self._records.pop(title, None)
+
+
+def _diff_cells(current, desired):
+    """두 2차원 값 목록을 비교해 batch_update용 범위 목록을 만듭니다
+
+    한 행에서 연속으로 바뀐 셀은 하나의 범위로 묶고, desired에 없는 기존 셀은 빈 값으로 지웁니다.
+    """
+    updates = []
+    n_rows = max(len(current), len(desired))
+    for r in range(n_rows):
+        old_row = current[r] if r < len(current) else []
+        new_row = desired[r] if r < len(desired) else []
+        n_cols = max(len(old_row), len(new_row))
+        run_start, run_values = None, []
+        for c in range(n_cols + 1):
+            old = old_row[c] if c < len(old_row) else ""
+            new = new_row[c] if c < len(new_row) else ""
+            if c < n_cols and old != new:
+                if run_start is None:
+                    run_start = c
+                run_values.append(new)
+            elif run_start is not None:
+                updates.append({"range": rowcol_to_a1(r + 1, run_start + 1), "values": [run_values]})
+                run_start, run_values = None, []
+    return updates
+
+
+def _build_role_index(records):
+    index = {}
+    for row in records:
+        email = _normalize_email(row.get("email"))
+        if email and email not in index:  # 중복 시 첫 행 우선 (기존 동작과 동일)
+            index[email] = row.get("role")
+    return index
+
+
+def _build_email_set(records):
+    return {_normalize_email(row.get("email")) for row in records if row.get("email")}
+
+
+def _normalize_email(email):
+    return str(email or "").strip().lower()
+
+
+@st.cache_resource(show_spinner=False)
+def get_sheet_repository():
+    """서버 프로세스 전체에서 공유하는 SheetRepository"""
+    return SheetRepository(get_spreadsheet())
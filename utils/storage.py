@@ -0,0 +1,158 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# 다운로더 결과 파일 전용 디렉토리와 한도 (환경변수로 조정 가능)
+STORAGE_DIR = Path(os.environ.get("YTDOWN_STORAGE_DIR", Path(tempfile.gettempdir()) / "ytdown_storage"))
+STORAGE_QUOTA_BYTES = int(os.environ.get("YTDOWN_STORAGE_QUOTA_BYTES", 5 * 1024 ** 3))  # 5GB
+STORAGE_MAX_AGE_SECONDS = int(os.environ.get("YTDOWN_STORAGE_MAX_AGE_SECONDS", 7 * 24 * 60 * 60))  # 7일
+# 최근에 만들었거나 사용한 파일은 내려받는 중일 수 있으므로 지우지 않음
+RECENT_USE_GRACE_SECONDS = 10 * 60
+# 작성 중 파일은 이 시간 동안 수정되지 않았을 때만 남은 파일로 보고 지움 (진행 중인 다운로드는 계속 수정됨)
+PARTIAL_GRACE_SECONDS = 60 * 60
+
+
+def _is_partial(path):
+    # 작성 중인 파일 (작업별 임시 파일, yt-dlp .part/.ytdl 등)은 이름이 '.'으로 시작
+    return path.name.startswith(".") or path.suffix in (".part", ".ytdl")
+
+
+class StorageManager:
+    """다운로더 결과 파일의 저장공간 관리
+
+    전용 디렉토리에 용량 한도를 두고, 오래되었거나(age) 오래 사용하지 않은(LRU) 파일부터 지웁니다.
+    정리는 백그라운드 스레드에서 하므로 다운로드 경로에는 지연이 생기지 않습니다.
+    서버가 시작될 때 이전 실행에서 남은 작성 중 파일(.part 등)을 정리합니다.
+    """
+
+    def __init__(self, root=STORAGE_DIR, quota_bytes=STORAGE_QUOTA_BYTES, max_age=STORAGE_MAX_AGE_SECONDS):
+        self.root = Path(root)
+        self.quota_bytes = quota_bytes
+        self.max_age = max_age
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._cleanup_partials()
+        threading.Thread(target=self._eviction_loop, name="storage-evict", daemon=True).start()
+
+    def touch(self, path):
+        """파일을 방금 사용한 것으로 표시합니다 (LRU 순서 갱신)"""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def request_eviction(self):
+        """백그라운드 정리를 요청합니다 (바로 반환)"""
+        self._wakeup.set()
+
+    def stats(self):
+        """사용량 요약"""
+        files, total, oldest = 0, 0, None
+        partial_files, partial_bytes = 0, 0
+        for path, stat in self._scan():
+            if _is_partial(path):
+                partial_files += 1
+                partial_bytes += stat.st_size
+                continue
+            files += 1
+            total += stat.st_size
+            oldest = stat.st_mtime if oldest is None else min(oldest, stat.st_mtime)
+        return {
+            "root": str(self.root),
+            "files": files,
+            "bytes": total,
+            "partial_files": partial_files,
+            "partial_bytes": partial_bytes,
+            "quota_bytes": self.quota_bytes,
+            "usage": total / self.quota_bytes if self.quota_bytes else 0,
+            "oldest_age_seconds": time.time() - oldest if oldest else 0,
+            "evicted_files": self.evicted_files,
+            "evicted_bytes": self.evicted_bytes,
+            "disk_free_bytes": shutil.disk_usage(self.root).free,
+        }
+
+    def _scan(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = Path(dirpath) / name
+                try:
+                    yield path, path.stat()
+                except FileNotFoundError:
+                    continue
+
+    def _cleanup_partials(self):
+        # 다른 관리자(이전 실행, 캐시를 비우기 전의 인스턴스)의 작업이 아직 쓰고 있을 수 있으므로
+        # 한동안 수정되지 않은 작성 중 파일만 잔여물로 보고 지움
+        cutoff = time.time() - PARTIAL_GRACE_SECONDS
+        for path, stat in list(self._scan()):
+            if _is_partial(path) and stat.st_mtime < cutoff:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+        self._remove_empty_dirs()
+
+    def _remove_empty_dirs(self):
+        for dirpath, dirnames, filenames in os.walk(self.root, topdown=False):
+            if Path(dirpath) != self.root and not dirnames and not filenames:
+                try:
+                    os.rmdir(dirpath)
+                except OSError:
+                    pass
+
+    def _eviction_loop(self):
+        while True:
+            # 요청이 없어도 주기적으로 오래된 파일을 정리
+            self._wakeup.wait(timeout=10 * 60)
+            self._wakeup.clear()
+            try:
+                self.evict()
+            except Exception as e:
+                print(f"Storage eviction failed: {e}") # 서버 로그용
+
+    def evict(self):
+        """오래된 파일과 한도를 넘는 파일을 지웁니다"""
+        with self._lock:
+            now = time.time()
+            entries, total = [], 0
+            for path, stat in self._scan():
+                if _is_partial(path):
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+            for mtime, size, path in sorted(entries):
+                too_old = now - mtime > self.max_age
+                if not too_old and total <= self.quota_bytes:
+                    break
+                if now - mtime < RECENT_USE_GRACE_SECONDS:
+                    continue
+                try:
+                    path.unlink()
+                except OSError:
+                    continue
+                total -= size
+                self.evicted_files += 1
+                self.evicted_bytes += size
+            self._remove_empty_dirs()
+
+
+_storage_manager = None
+_storage_manager_lock = threading.Lock()
+
+
+def get_storage_manager():
+    """서버 프로세스당 하나의 저장공간 관리자 (생성 시 잔여 임시 파일 정리)
+
+    정리 스레드가 둘이 되지 않도록, 캐시를 비워도 다시 만들지 않는 모듈 전역으로 둡니다.
+    """
+    global _storage_manager
+    with _storage_manager_lock:
+        if _storage_manager is None:
+            _storage_manager = StorageManager()
+        return _storage_manager
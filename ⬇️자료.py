@@ -1,14 +1,16 @@
 import streamlit as st
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload, MediaIoBaseUpload
-from google.oauth2.service_account import Credentials
-import io
+import os
+from pathlib import Path
+from utils.google_clients import get_drive_service
+from utils.drive_cache import build_zip, get_drive_cache
+from utils.drive_files import download_mime, download_name, format_size, is_folder, is_google_doc
+from utils.drive_index import get_folder_index
+from utils.file_server import get_file_server
 
-# 구글 서비스 계정 인증
-SERVICE_ACCOUNT_INFO = st.secrets["google_service_account"]
-SCOPES = ["https://www.googleapis.com/auth/drive"]
-credentials = Credentials.from_service_account_info(SERVICE_ACCOUNT_INFO, scopes=SCOPES)
-drive_service = build('drive', 'v3', credentials=credentials)
+# 공유 Drive 서비스 (서버 프로세스당 한 번만 생성)
+drive_service = get_drive_service()
+# 내려받은 파일/PDF 내보내기 결과를 디스크에 보관 (모든 세션 공유)
+drive_cache = get_drive_cache()
 
 # 로그인/권한 정보 불러오기
 user_role = st.session_state.get("user_role")
@@ -29,71 +31,161 @@ if user_role not in data_allowed_roles:
 else:
     folder_id = '1ahi_xExDjtil5df7oCyMCH1l7A5aj_w-' 
 
-    results = drive_service.files().list(
-        q=f"'{folder_id}' in parents and trashed = false",
-        fields="files(id, name, mimeType)"
-    ).execute()
-    files = results.get('files', [])
+    # 목록은 로컬 인덱스(변경분만 반영)의 메타데이터로 그리고, 파일 내용은 사용자가 요청할 때만 받음
+    folder_index = get_folder_index(folder_id)
 
-    if files:
-        col_header1, col_header2 = st.columns([4, 1])
-        col_header1.markdown("##파일 이름")
-        col_header2.markdown("##다운로드")
+    # 이 세션에서 준비를 요청한 파일 id (캐시에 있으면 준비는 즉시 끝남)
+    if "drive_prepared" not in st.session_state:
+        st.session_state["drive_prepared"] = set()
+    prepared = st.session_state["drive_prepared"]
+    # 이 세션에서 펼친 하위 폴더 id
+    if "drive_open_folders" not in st.session_state:
+        st.session_state["drive_open_folders"] = set()
+    open_folders = st.session_state["drive_open_folders"]
+    # ZIP으로 받을 파일 (file id -> metadata)
+    if "drive_selected" not in st.session_state:
+        st.session_state["drive_selected"] = {}
+    selected_files = st.session_state["drive_selected"]
+
+    def prepare_download(file):
+        try:
+            drive_cache.get_path(drive_service, file)
+            prepared.add(file['id'])
+        except Exception:
+            st.session_state["drive_download_error"] = file['name']
+
+    def zip_downloaded():
+        # 버튼을 그릴 때 내용을 이미 넘겼으므로 디스크의 ZIP을 지움
+        zip_path = st.session_state.pop("drive_zip_path", None)
+        if zip_path:
+            Path(zip_path).unlink(missing_ok=True)
+
+    def toggle_folder(folder):
+        open_folders.symmetric_difference_update({folder['id']})
+
+    def toggle_selected(file, key):
+        if st.session_state[key]:
+            selected_files[file['id']] = file
+        else:
+            selected_files.pop(file['id'], None)
+
+    def render_file_row(file, label, key_prefix, depth=0):
+        col1, col2 = st.columns([4, 1])
+        indent = "\u2003" * 2 * depth  # 하위 폴더 들여쓰기
+        with col1:
+            if is_folder(file):
+                st.markdown(f"{indent}📁 {label}")
+            else:
+                select_key = f"{key_prefix}_select_{file['id']}"
+                st.checkbox(
+                    f"{indent}{label}",
+                    value=file['id'] in selected_files,
+                    key=select_key,
+                    on_change=toggle_selected,
+                    args=(file, select_key)
+                )
+                if file.get('size'):
+                    st.caption(format_size(int(file['size'])))
+
+        with col2:
+            if is_folder(file):
+                # 하위 폴더는 펼칠 때 목록을 받음
+                st.button(
+                    "닫기" if file['id'] in open_folders else "열기",
+                    key=f"{key_prefix}_folder_{file['id']}",
+                    on_click=toggle_folder,
+                    args=(file,)
+                )
+            elif not file.get('id'):
+                st.write("-")
+            elif file['id'] in prepared and (cached_path := drive_cache.lookup(file)) is not None:
+                st.download_button(
+                    label="다운로드",
+                    data=cached_path.read_bytes(),
+                    file_name=download_name(file),
+                    mime=download_mime(file),
+                    key=f"{key_prefix}_download_{file['id']}"
+                )
+            else:
+                st.button(
+                    "PDF 준비" if is_google_doc(file) else "파일 준비",
+                    key=f"{key_prefix}_prepare_{file['id']}",
+                    on_click=prepare_download,
+                    args=(file,)
+                )
         st.markdown("---")
 
-        for file in files:
-            col1, col2 = st.columns([4, 1])
-            with col1:
-                st.write(file['name'])
-            
-            with col2:
-                mime = file.get('mimeType', '')
-                if mime.startswith('application/vnd.google-apps.'):
-                    if mime == 'application/vnd.google-apps.folder':
-                        st.write("-") # 폴더는 다운로드 제공 안 함
-                    else:
-                        export_mime_type = 'application/pdf'
-                        export_file_name = f"{file['name']}.pdf"
-                        try:
-                            request = drive_service.files().export_media(fileId=file['id'], mimeType=export_mime_type)
-                            fh = io.BytesIO()
-                            downloader = MediaIoBaseDownload(fh, request)
-                            done = False
-                            while not done:
-                                _, done = downloader.next_chunk()
-                            fh.seek(0)
-                            st.download_button(
-                                label="PDF로 다운로드",
-                                data=fh,
-                                file_name=export_file_name,
-                                mime=export_mime_type,
-                                key=f"export_{file['id']}"
-                            )
-                        except Exception as e:
-                            # st.error(f"Export 오류: {e}") # 상세 오류 대신 간단한 메시지
-                            st.write("-") # 오류 시 다운로드 불가 표시
-                elif file.get('id'): 
-                    try:
-                        request = drive_service.files().get_media(fileId=file['id'])
-                        fh = io.BytesIO()
-                        downloader = MediaIoBaseDownload(fh, request)
-                        done = False
-                        while not done:
-                            _, done = downloader.next_chunk()
-                        fh.seek(0)
-                        st.download_button(
-                            label="다운로드",
-                            data=fh,
-                            file_name=file['name'],
-                            mime=mime if mime else 'application/octet-stream',
-                            key=f"download_{file['id']}"
-                        )
-                    except Exception as e:
-                        # st.error(f"다운로드 오류: {e}") # 상세 오류 대신 간단한 메시지
-                        st.write("-") # 오류 시 다운로드 불가 표시
+    def render_folder(parent_id, depth=0):
+        for file in folder_index.list(parent_id):
+            render_file_row(file, file['name'], "tree", depth)
+            if is_folder(file) and file['id'] in open_folders:
+                render_folder(file['id'], depth + 1)
+
+    failed_name = st.session_state.pop("drive_download_error", None)
+    if failed_name:
+        st.error(f"'{failed_name}' 파일을 가져오지 못했습니다.")
+
+    # 선택한 파일을 ZIP 하나로 받기
+    if selected_files:
+        zip_col1, zip_col2 = st.columns([4, 1])
+        with zip_col1:
+            st.markdown(f"**선택한 파일 {len(selected_files)}개**")
+            if st.button("ZIP 만들기", type="primary"):
+                progress_bar = st.progress(0.0)
+                # 이전에 만들고 받지 않은 ZIP은 정리
+                zip_downloaded()
+                st.session_state.pop("drive_zip_url", None)
+                zip_path = drive_cache.new_zip_path()
+                file_server = get_file_server()
+                try:
+                    failed = build_zip(
+                        drive_service, drive_cache, list(selected_files.values()), zip_path,
+                        on_progress=lambda done, total: progress_bar.progress(done / total)
+                    )
+                except Exception:
+                    os.unlink(zip_path)
+                    raise
+                if file_server is not None:
+                    # 파일 서버가 디스크에서 스트리밍하고, 전송이 끝나면 ZIP을 지움
+                    st.session_state["drive_zip_url"] = file_server.register(
+                        zip_path, "자료실.zip", "application/zip", delete_after=True
+                    )
                 else:
-                    st.write("-")
-            st.markdown("---")
+                    # 세션에 내용을 들고 있지 않고, 버튼을 그릴 때만 디스크에서 읽음
+                    st.session_state["drive_zip_path"] = zip_path
+                if failed:
+                    st.warning(f"가져오지 못한 파일: {', '.join(failed)}")
+        with zip_col2:
+            if st.session_state.get("drive_zip_url"):
+                st.link_button("ZIP 다운로드", st.session_state["drive_zip_url"])
+            elif st.session_state.get("drive_zip_path") and os.path.exists(st.session_state["drive_zip_path"]):
+                with open(st.session_state["drive_zip_path"], "rb") as fh:
+                    st.download_button(
+                        label="ZIP 다운로드",
+                        data=fh,
+                        file_name="자료실.zip",
+                        mime="application/zip",
+                        on_click=zip_downloaded
+                    )
+        st.markdown("---")
 
+    # 파일 이름 검색 (하위 폴더 전체를 처음 한 번 병렬로 색인)
+    search_query = st.text_input("파일 검색", placeholder="파일 이름 일부를 입력하세요")
+    if search_query.strip():
+        with st.spinner("하위 폴더를 색인하는 중..."):
+            folder_index.build_tree(folder_id)
+        results = folder_index.search(search_query)
+        st.markdown(f"**검색 결과: {len(results)}건**")
+        st.markdown("---")
+        for file, path in results:
+            render_file_row(file, path, "search")
+        if not results:
+            st.info("검색 결과가 없습니다.")
+    elif folder_index.list(folder_id):
+        col_header1, col_header2 = st.columns([4, 1])
+        col_header1.markdown("##파일 이름")
+        col_header2.markdown("##다운로드")
+        st.markdown("---")
+        render_folder(folder_id)
     else:
         st.info("폴더에 파일이 없습니다.")